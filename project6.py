@@ -3,7 +3,34 @@ import random
 import time
 import string
 import re
-import matplotlib.pyplot as plt
+import os
+import json
+import tempfile
+import contextlib
+import platform
+import hashlib
+import pickle
+import argparse
+from urllib.parse import urlsplit, parse_qs
+import tracemalloc
+import cProfile
+import glob
+import locale
+import codecs
+import io
+import mmap
+import sys
+import struct
+import heapq
+from array import array
+from itertools import islice, groupby, accumulate
+from operator import itemgetter, gt, eq
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, OrderedDict
+from statistics import NormalDist, median, quantiles
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+# (matplotlib and asyncio are imported where they are needed, since they take longer to import than most stages take to run)
 
 # ******************** constants: BEGIN ********************
 EPSILON = 1e-15
@@ -11,6 +38,35 @@ N_ITERATIONS = 100000
 N_DAYS_IN_YEAR = 365
 N_DEFAULT_CLASS_SIZE = 23
 N_SIM_SERIES = 6    # note that for formatting purposes, the number of series should be an even number > 0
+N_BD_SIM_CHUNK_CELLS = 2**22    # max number of birthdays the numpy engine draws at once (bounds the memory of each chunk)
+N_BD_SIM_ADAPTIVE_MIN_BATCH = 1000  # size of the first batch of the adaptive (early-stopping) simulation
+N_BD_SIM_ADAPTIVE_MAX_SIMS = 10**8  # hard cap on the number of simulations the adaptive simulation may run
+N_DEFAULT_CONVERGENCE_POINTS = 1000 # number of points a ConvergenceRecorder keeps (and plots) per simulation run, whatever the number of simulations
+N_DEFAULT_CHUNK_SIZE = 2**20    # number of chars read at a time by the streaming text functions
+N_DEFAULT_SHARD_SIZE = 64 * 2**20   # number of bytes of a text file handed to a single worker by the corpus (map-reduce) functions
+N_DEFAULT_LOOKUP_BATCH_SIZE = 2**16  # number of targets bisect_many() looks up at a time (bounds memory when streaming targets)
+N_CORPUS_STORE_BLOCK_SIZE = 2**24   # number of token ids a CorpusStore processes at a time (bounds memory whatever the size of the corpus)
+S_DEFAULT_CACHE_DIR = ".project6-cache"   # where the result cache (see inverted_index_cached()) lives
+N_DEFAULT_CACHE_MAX_ENTRIES = 64    # the result cache evicts its least recently used entries beyond this many...
+N_DEFAULT_CACHE_MAX_BYTES = 2**30   # ...or beyond this many bytes
+N_CACHE_FINGERPRINT_BLOCK_SIZE = 2**16  # size of the head and tail blocks hashed to fingerprint a file's content
+S_DEFAULT_TOKENIZER = "translate"    # the tokenize_text() engine used by default (see D_TOKENIZER_ENGINES)
+N_DEFAULT_TOP_K = 1000  # number of most frequent words reported by top_k_words()
+N_DEFAULT_WORD_MEMORY_BYTES = 64 * 2**20    # memory budget of the approximate (SpaceSaving) word counts
+# (the 3 SpaceSaving overheads below were measured with tracemalloc on 64-bit CPython 3.11: other builds and versions lay objects out differently)
+N_SPACE_SAVING_BYTES_PER_ENTRY = 320  # measured cost of one SpaceSaving counter besides its word (2 dictionary entries, 1 heap entry, the counts), including dictionary resizing while evicting
+N_SPACE_SAVING_BYTES_PER_CHUNK_CHAR = 32  # measured peak cost of counting a chunk, per char (its text, its words and their chunk-local Counter), for short distinct words
+N_SPACE_SAVING_READER_BYTES = 2**17  # measured peak cost of the text file reader's buffers (its blocks, decoded at up to 4 bytes per char), with headroom
+N_INSTRUMENTED_BATCH_SIZE = 2**14  # number of tokens timed at once per stage when instrumentation is on
+S_DEFAULT_SERVICE_HOST = "127.0.0.1"    # the summarization service only listens locally by default
+N_DEFAULT_SERVICE_PORT = 8174
+N_DEFAULT_SERVICE_CONCURRENCY = 4   # max number of computations the service runs at once
+N_DEFAULT_SERVICE_CACHE_ENTRIES = 128   # the service keeps (at most) this many results, evicting the least recently used...
+N_DEFAULT_SERVICE_CACHE_BYTES = 256 * 2**20     # ...and (at most) this many bytes of them (as estimated by approx_nbytes())
+N_SERVICE_MAX_REQUEST_BYTES = 2**16
+N_BENCHMARK_WARMUP = 2     # number of untimed runs before a benchmark starts sampling
+N_BENCHMARK_SAMPLES = 15    # number of timed runs (samples) per benchmark
+N_DEFAULT_BLOCK_SIZE = 4 * 2**20    # number of chars (or bytes, when memory-mapped) words_file_to_toggle_case() processes at a time
 
 S_ADD_SINGLETON_LIST_IDIOM = "t += [x] idiom"
 S_LIST_APPEND_METHOD = "List.append() method"
@@ -27,6 +83,43 @@ TEXT_FILE_SUMMARY_TEMPLATE = """
 {}
 """
 
+# the byte values str.split() treats as whitespace (that can never be part of a multi-byte char in an ASCII-compatible encoding)
+RE_WHITESPACE_BYTE = re.compile(rb"[ \t\n\r\x0b\x0c\x1c-\x1f]")
+
+# encodings in which a byte range can safely be cut right after an ASCII whitespace byte
+S_ASCII_COMPATIBLE_ENCODINGS = {"utf-8", "ascii", "latin-1", "iso8859-1", "cp1252"}
+
+# translation table that swaps the case of the ASCII letters (and leaves every other byte alone)
+B_TOGGLE_CASE_ASCII_TABLE = bytes.maketrans(
+    (string.ascii_uppercase + string.ascii_lowercase).encode("ascii"),
+    (string.ascii_lowercase + string.ascii_uppercase).encode("ascii")
+)
+
+# on-disk word index (see build_word_index()): magic, then the number of words, then n+1 offsets, then the UTF-8 blob of all the words
+B_WORD_INDEX_MAGIC = b"P6WIDX01"
+S_WORD_INDEX_HEADER_FORMAT = "<8sQ"
+S_CORPUS_STORE_FORMAT = "project6-corpus-store-1"
+
+S_BISECT_MANY_STRATEGIES = ("auto", "bisect", "merge", "hash", "searchsorted")
+S_CONVERGENCE_MODES = ("log", "minmax")
+
+S_BENCHMARK_REPORTS = ("stages", "sim-scaling", "lookups", "tokenizers")  # what the benchmark subcommand can report (see cli_benchmark())
+L_BENCHMARK_STAGES = ["read", "read (t += [x])", "tokenize", "index", "summarize", "toggle-case", "bisect"]
+L_BENCHMARK_INPUT_SIZES = [2**14, 2**17, 2**20]   # (bytes) input sizes swept by run_benchmark_suite()
+F_BENCHMARK_REGRESSION_TOLERANCE = 0.10   # a stage regresses when its median is more than 10% slower than the baseline's
+
+S_METRICS_PREFIX = "project6"   # prefix of the metric names exported in the Prometheus text format
+
+# process_token_to_word() deletes every char matched by [^\w\s]: these are the ones in the ASCII range
+RE_NON_WORD_CHARS = re.compile(r"[^\w\s]+")
+B_ASCII_NON_WORD_CHARS = bytes([i for i in range(128) if re.match(r"[^\w\s]", chr(i))])
+
+# per-code-point masks (for the dense, array-backed range of CharCounts) of: whitespace, upper-case letters and other letters (as counted by format_text_file_summary())
+N_CHAR_COUNTS_DENSE_SIZE = 256
+A_CHAR_IS_SPACE = np.array([chr(i).isspace() for i in range(N_CHAR_COUNTS_DENSE_SIZE)])
+A_CHAR_IS_UPPER = np.array([chr(i).isalpha() and chr(i).isupper() for i in range(N_CHAR_COUNTS_DENSE_SIZE)])
+A_CHAR_IS_LOWER = np.array([chr(i).isalpha() and not chr(i).isupper() for i in range(N_CHAR_COUNTS_DENSE_SIZE)])
+
 QUIT_MESSAGE = "THAT'S ALL FOLKS!  Thanks for playing.  Bye bye."
 # ******************** constants: END ********************
 
@@ -34,24 +127,216 @@ QUIT_MESSAGE = "THAT'S ALL FOLKS!  Thanks for playing.  Bye bye."
 
 
 # ******************** functions: BEGIN ********************
+class StageMetrics:
+    """
+    This class collects per-stage timings and counters for one instrumented run (see enable_instrumentation()).
+
+        stage(s_stage)          context manager that adds the wall-clock and CPU time spent inside it to the stage (and counts the call)
+        count(s_counter, n)     adds n to a counter (e.g. bytes read, tokens)
+        set_gauge(s_gauge, v)   records a value (e.g. number of unique words, peak memory)
+
+    and exports them with to_json() or to_prometheus() (Prometheus text exposition format).
+    """
+
+    def __init__(self):
+        self.d_stages = {}
+        self.d_counters = {}
+        self.d_gauges = {}
+
+    @contextlib.contextmanager
+    def stage(self, s_stage):
+        t_wall0 = time.perf_counter_ns()
+        t_cpu0 = time.process_time_ns()
+        try:
+            yield
+        finally:
+            d_stage = self.d_stages.get(s_stage)
+            if d_stage is None:
+                d_stage = self.d_stages[s_stage] = {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0}
+            d_stage["calls"] += 1
+            d_stage["wall_seconds"] += (time.perf_counter_ns() - t_wall0) / 1e9
+            d_stage["cpu_seconds"] += (time.process_time_ns() - t_cpu0) / 1e9
+
+    def count(self, s_counter, n=1):
+        self.d_counters[s_counter] = self.d_counters.get(s_counter, 0) + n
+
+    def set_gauge(self, s_gauge, value):
+        self.d_gauges[s_gauge] = value
+
+    def to_dict(self):
+        return {"stages": self.d_stages, "counters": self.d_counters, "gauges": self.d_gauges}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self):
+        l_lines = []
+
+        for s_field, s_help in [("wall_seconds", "Wall-clock time spent in each pipeline stage."), ("cpu_seconds", "CPU time spent in each pipeline stage."), ("calls", "Number of times each pipeline stage ran.")]:
+            s_metric = f"{S_METRICS_PREFIX}_stage_{s_field}_total"
+            l_lines += [f"# HELP {s_metric} {s_help}", f"# TYPE {s_metric} counter"]
+            l_lines += [f'{s_metric}{{stage="{s_stage}"}} {d_stage[s_field]}' for s_stage, d_stage in self.d_stages.items()]
+
+        for s_counter, n in self.d_counters.items():
+            s_metric = f"{S_METRICS_PREFIX}_{re.sub(r'[^a-zA-Z0-9_]', '_', s_counter)}_total"
+            l_lines += [f"# TYPE {s_metric} counter", f"{s_metric} {n}"]
+
+        for s_gauge, value in self.d_gauges.items():
+            s_metric = f"{S_METRICS_PREFIX}_{re.sub(r'[^a-zA-Z0-9_]', '_', s_gauge)}"
+            l_lines += [f"# TYPE {s_metric} gauge", f"{s_metric} {value}"]
+
+        return "\n".join(l_lines) + "\n"
+
+# the active StageMetrics (None means instrumentation is off, which costs a single global lookup per stage)
+METRICS = None
+METRICS_PROFILER = None
+METRICS_CPROFILE_FNAME = None
+NULL_STAGE = contextlib.nullcontext()
+
+def enable_instrumentation(b_trace_memory=False, fname_cprofile=None):
+    """
+    This function turns instrumentation on: from now on, the pipeline functions record their stage timings and counters into a fresh StageMetrics.
+
+    arguments:
+        b_trace_memory: also trace memory allocations (with tracemalloc, which slows Python down noticeably) and record the peak as the peak_memory_bytes gauge
+        fname_cprofile: also run the cProfile profiler, and dump its stats to this file (readable with pstats) when instrumentation is turned off
+
+    returns:
+        the StageMetrics being recorded into
+    """
+
+    global METRICS, METRICS_PROFILER, METRICS_CPROFILE_FNAME
+
+    METRICS = StageMetrics()
+
+    if b_trace_memory:
+        tracemalloc.start()
+
+    METRICS_CPROFILE_FNAME = fname_cprofile
+    if fname_cprofile is not None:
+        METRICS_PROFILER = cProfile.Profile()
+        METRICS_PROFILER.enable()
+
+    return METRICS
+
+def disable_instrumentation():
+    """
+    This function turns instrumentation off (finishing the memory trace and the cProfile dump, if they were requested).
+
+    returns:
+        the StageMetrics that was recorded into (or None if instrumentation was not on)
+    """
+
+    global METRICS, METRICS_PROFILER, METRICS_CPROFILE_FNAME
+
+    metrics = METRICS
+    METRICS = None
+
+    if METRICS_PROFILER is not None:
+        METRICS_PROFILER.disable()
+        METRICS_PROFILER.dump_stats(METRICS_CPROFILE_FNAME)
+        METRICS_PROFILER = None
+        METRICS_CPROFILE_FNAME = None
+
+    if tracemalloc.is_tracing():
+        _, n_peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if metrics is not None:
+            metrics.set_gauge("peak_memory_bytes", n_peak_bytes)
+
+    return metrics
+
+def instrumented_stage(s_stage):
+    """
+    This function returns the context manager that times stage s_stage when instrumentation is on, and a (shared, do-nothing) null context otherwise.
+    """
+
+    return METRICS.stage(s_stage) if METRICS is not None else NULL_STAGE
+
+def count_metric(s_counter, n=1):
+    if METRICS is not None:
+        METRICS.count(s_counter, n)
+
+
 def is_sorted(l):
-    n = len(l)
+    """
+    This function returns True if every element of l is <= the next one.
 
-    if n == 1:
-        return True
+    A SortedList is sorted by construction, so it is not even looked at.
+        Otherwise every adjacent pair is compared by map() and any() (which stops at the first pair out of order) in C, instead of a Python loop with indexing.
+    """
 
-    # since we compare indices i and i+1, we range from 0 to len(l)-2
-    for i in range(n-1):  # recall that n-1 is not inclusive when using range()
-        if l[i] > l[i+1]:
-            return False 
+    if isinstance(l, SortedList):
+        return True
 
-    return True
+    return not any(map(gt, l, islice(l, 1, None)))
 
 def test_is_sorted(l):
     b_result = is_sorted(l)
     print(f"\tTEST is_sorted(l={l}): {b_result}")
 
 
+class SortedList:
+    """
+    This is a sequence that is always sorted, so the functions below that need sorted input (is_sorted(), is_anagram(), has_duplicates(), remove_duplicates(), bisect(), bisect_many())
+        can skip both the is_sorted() check and the re-sort when they are given one, however many of them a pipeline chains.
+
+    The elements are kept in a list or, when typecode is given (e.g. 'q' for ints, 'd' for floats), in a compact array.array.
+        add() finds the insertion point by binary search (O(log n) comparisons) and inserts there (a memory move, no re-sort).
+    """
+
+    __slots__ = ("l",)
+
+    def __init__(self, iterable=(), typecode=None):
+        l = sorted(iterable)
+        self.l = array(typecode, l) if typecode is not None else l
+
+    def add(self, e):
+        insort(self.l, e)
+
+    def update(self, iterable):
+        # (sorted() is a merge of runs, so re-sorting the sorted elements plus a batch of new ones is cheaper than inserting them one at a time)
+        self.l.extend(iterable)
+        self.l = array(self.l.typecode, sorted(self.l)) if isinstance(self.l, array) else sorted(self.l)
+
+    def remove(self, e):
+        i = self.index(e)
+        del self.l[i]
+
+    def find(self, e):
+        """
+        returns:
+            the index of the first occurrence of e, or None if e is not in the list
+        """
+
+        i = bisect_left(self.l, e)
+        return i if i < len(self.l) and self.l[i] == e else None
+
+    def index(self, e):
+        i = self.find(e)
+        if i is None:
+            raise ValueError(f"{e!r} is not in SortedList")
+        return i
+
+    def count(self, e):
+        return bisect_right(self.l, e) - bisect_left(self.l, e)
+
+    def __len__(self):
+        return len(self.l)
+
+    def __getitem__(self, i):
+        return self.l[i]
+
+    def __iter__(self):
+        return iter(self.l)
+
+    def __contains__(self, e):
+        return self.find(e) is not None
+
+    def __repr__(self):
+        return f"SortedList({list(self.l)!r})"
+
+
 def str_to_list(s):
     """
     This function converts a string to a list of chars (in case we want to modify the list somehow)
@@ -73,10 +358,41 @@ def to_lcase(l):
     return l_lcase
 
 
+def is_sorted_list_of_str(*l_sorted_lists):
+    """
+    This function returns True if any of the SortedLists holds strs, whose sorted order lower-casing can change (e.g. ['B', 'a'] becomes ['b', 'a']).
+    """
+
+    return any(len(l) > 0 and type(l[0]) is str for l in l_sorted_lists)
+
 def is_anagram(l1, l2, normalize_char_case=True):
     """
     Normally anagrams are based on words only.
     But this function supports numeric lists as anagrams, as well..
+
+    Two inputs are anagrams when they contain the same elements the same number of times, so we simply count the elements of each (O(n)) and compare the counts.
+        str elements are lower-cased one at a time as they are counted (when normalize_char_case).
+        If the elements turn out to be unhashable (e.g. lists), we fall back to the sort-based is_anagram__sorted().
+        Two SortedLists are simply compared element by element (unless lower-casing could change their order).
+    """
+
+    # we can short-circuit when the lengths are unequal
+    if len(l1) != len(l2):
+        return False
+
+    if isinstance(l1, SortedList) and isinstance(l2, SortedList) and not (normalize_char_case and is_sorted_list_of_str(l1, l2)):
+        return all(map(eq, l1, l2))
+
+    try:
+        if normalize_char_case:
+            return Counter(e.lower() if type(e) is str else e for e in l1) == Counter(e.lower() if type(e) is str else e for e in l2)
+        return Counter(l1) == Counter(l2)
+    except TypeError:   # unhashable element
+        return is_anagram__sorted(l1, l2, normalize_char_case=normalize_char_case)
+
+def is_anagram__sorted(l1, l2, normalize_char_case=True):
+    """
+    This is the sort-based version of is_anagram(): O(n log n), but it works for any elements that can be compared (hashable or not).
     """
 
     n1 = len(l1)
@@ -116,6 +432,44 @@ def test_is_anagram(l1, l2, normalize_char_case=True):
 
 
 def has_duplicates(l, disregard_char_case=False):
+    """
+    This function returns True if any element of l appears more than once (l is not modified).
+
+    Note that (as has always been the case) str elements are compared lower-cased UNLESS disregard_char_case is True.
+
+    Elements are checked one at a time against a set of the elements seen so far, so this is O(n) and stops at the first repeat.
+        Each element is lower-cased as it is checked (no lower-cased copy of the whole list is made up front).
+        If the elements turn out to be unhashable (e.g. lists), we fall back to the sort-based has_duplicates__sorted().
+        In a SortedList duplicates are adjacent, so only adjacent pairs are compared (unless lower-casing could change its order).
+    """
+
+    # a 0 or single element list cannot have duplicates, so we can short-circuit
+    if len(l) < 2:
+        return False
+
+    if isinstance(l, SortedList) and (disregard_char_case or not is_sorted_list_of_str(l)):
+        return any(map(eq, l, islice(l, 1, None)))
+
+    b_lcase = not disregard_char_case
+    s_seen = set()
+    try:
+        for e in l:
+            if b_lcase and type(e) is str:
+                e = e.lower()
+            if e in s_seen:
+                return True
+            s_seen.add(e)
+    except TypeError:   # unhashable element
+        return has_duplicates__sorted(l, disregard_char_case=disregard_char_case)
+
+    return False
+
+def has_duplicates__sorted(l, disregard_char_case=False):
+    """
+    This is the sort-based version of has_duplicates(): O(n log n), but it works for any elements that can be compared (hashable or not).
+    """
+
+
     n = len(l)
 
     # a 0 or single element list is already implicitly sorted, so we can short-circuit
@@ -145,342 +499,2431 @@ def test_has_duplicates(l, disregard_char_case=False):
     print(f"\tTEST has_duplicates(l={l}, disregard_char_case={disregard_char_case}): {b_result}")
 
 
-def run_bd_paradox_sim(n_sims, n_class_size=N_DEFAULT_CLASS_SIZE, is_leap_year=False):
-    print(f"Running {n_sims} Birthday Paradox simulations on a class size of {n_class_size} students...")
-    p = 0
-    n_dups = 0
-    x = []
-    y = []
-    for i_sim in range(n_sims):
-        l_birthdays = [random.randint(1, N_DAYS_IN_YEAR + (1 if is_leap_year else 0)) for i in range(n_class_size)]
-        n_dups += 1 if has_duplicates(l_birthdays) else 0
-        x.append(i_sim)
-        y.append(n_dups / (i_sim+1))
-    p = n_dups / n_sims
-    print(f"\tDONE: The probability that at least 2 students from a class size of {n_class_size} have the same birthday converged to {p} after {n_sims} simulations.")
-
-    return p, x, y
+def bd_paradox_sim_chunk_dups(rng, n_sims, n_class_size=N_DEFAULT_CLASS_SIZE, is_leap_year=False):
+    """
+    This function is the vectorized (numpy) counterpart of calling has_duplicates() on n_sims lists of random birthdays.
 
-def run_bd_paradox_sim_series(n_powers_of_ten, n_class_size=N_DEFAULT_CLASS_SIZE, is_leap_year=False, do_plot=True):
-    exponents = list(range(1,n_powers_of_ten+1))
+    It draws an (n_sims, n_class_size) matrix of birthdays in one shot, sorts each row and then compares adjacent columns,
+        which flags every row (i.e. simulation) that contains at least one shared birthday.
 
-    n_cols = 2
-    n_rows = len(exponents) // n_cols
-    if do_plot:
-        fig, axes = plt.subplots(n_rows, n_cols, figsize=(8,4))
+    arguments:
+        rng:            a numpy.random.Generator
+        n_sims:         the number of simulations (rows) to draw
+        n_class_size:   the number of students (columns) in each simulation
+        is_leap_year
 
-    for i, e in enumerate(exponents):
-        n_sims = 10**e
-        p, x, y = run_bd_paradox_sim(n_sims=n_sims, n_class_size=N_DEFAULT_CLASS_SIZE, is_leap_year=False)
-        if do_plot:
-            axis = axes[i//n_cols][i%n_cols]
-            axis.set_title(f"# sims = {n_sims}, p = {p}")
-            axis.plot(x, y)
+    returns:
+        a boolean numpy array of length n_sims (True where the simulation produced a duplicate birthday)
+    """
 
-    if do_plot:
-        fig.tight_layout()
-        plt.show()
+    n_days = N_DAYS_IN_YEAR + (1 if is_leap_year else 0)
 
+    # uint16 is plenty for day numbers and keeps the matrix (and the sort) small
+    a_birthdays = rng.integers(1, n_days + 1, size=(n_sims, n_class_size), dtype=np.uint16)
+    a_birthdays.sort(axis=1)
 
-def remove_duplicates(l):
-    l = str_to_list(l)  # in case l is a string
+    a_dups = np.zeros(n_sims, dtype=bool)
+    if n_class_size < 2:
+        return a_dups
 
-    n = len(l)
+    # because each row is sorted, a duplicate necessarily shows up as an equal adjacent pair
+    #   comparing the flattened matrix (and masking out the pairs that straddle two rows) is much cheaper than any(axis=1) over short rows
+    a_flat = a_birthdays.ravel()
+    a_eq = a_flat[1:] == a_flat[:-1]
+    a_eq[n_class_size-1::n_class_size] = False
+    a_dups[np.flatnonzero(a_eq) // n_class_size] = True
 
-    # a 0 or single element list is already implicitly sorted, so we can short-circuit
-    if n < 2:
-        return l
+    return a_dups
 
-    # here we sort the list
-    #   this greatly simplifies the problem compared to not sorting
-    if not is_sorted(l):
-        l = sorted(l)
+def bd_paradox_sim_seed_seq(rng):
+    """
+    This function normalizes whatever was passed as rng into a numpy.random.SeedSequence (the root of every chunk's random stream).
 
-    l_dups_removed = []
-    
-    # iterate from index 0 to len(l)-2
-    #   only add the last non-repeating element, which we can do since the list has been sorted
-    for i in range(n-1): # recall that n-1 is not inclusive when using range()
-        if l[i] != l[i+1]:
-            l_dups_removed.append(l[i])
+    A Generator is not handed out directly: instead we draw a fresh root seed from it, which advances it (so a Generator shared across a series still produces different,
+        but reproducible, simulations).
+    """
 
-    # but we still have the very last index to add
-    #   this works since if there was a dup at the n-2 index, it will not have been added to l_dups_removed
-    l_dups_removed.append(l[n-1])
+    if isinstance(rng, np.random.SeedSequence):
+        return rng
+    if isinstance(rng, np.random.Generator):
+        return np.random.SeedSequence(int(rng.integers(2**63)))
+    return np.random.SeedSequence(rng)  # None means fresh OS entropy
 
-    return l_dups_removed
+def bd_paradox_sim_chunk_tasks(n_sims, n_cells_per_sim, rng, *task_args):
+    """
+    This function splits n_sims simulations into chunks of at most N_BD_SIM_CHUNK_CELLS cells and pairs every chunk with its own SeedSequence child (spawned by chunk index).
 
-def test_remove_duplicates(l):
-    b_result = remove_duplicates(l)
-    print(f"\tTEST remove_duplicates(l={l}): {b_result}")
+    Because the chunking only depends on n_sims and n_cells_per_sim, and each chunk's stream only on the root seed and the chunk index,
+        the draws are the same no matter how (or by how many processes) the chunks end up being executed.
 
+    returns:
+        1. the list of chunk start indices
+        2. the list of task tuples: (seed_seq, n_chunk_sims, *task_args)
+    """
 
-def words_file_to_list(fname, use_list_append=True):
-    l_words = []
+    n_chunk_sims = max(1, N_BD_SIM_CHUNK_CELLS // max(n_cells_per_sim, 1))
+    l_chunk_starts = list(range(0, n_sims, n_chunk_sims))
+    l_seed_seqs = bd_paradox_sim_seed_seq(rng).spawn(len(l_chunk_starts))
+    l_tasks = [
+        (seed_seq, min(n_chunk_sims, n_sims - i_chunk_start)) + task_args
+        for seed_seq, i_chunk_start in zip(l_seed_seqs, l_chunk_starts)
+    ]
 
-    try:
-        with open(fname, 'r') as f_words:
-            for words_line in f_words:
-                for word in words_line.split():
-                    if use_list_append:
-                        l_words.append(word.strip()) # dynamically resizes 
-                    else:
-                        l_words += [word] # adding to separate lists (which exist in two different places in memory)
-            f_words.close()
-    except Exception as e:
-        print(f"words_file_to_list: ***RUNTIME ERROR caught***: {e}")
+    return l_chunk_starts, l_tasks
 
-    return l_words
+def map_tasks(fn_task, l_tasks, workers=1, n_tasks_per_batch=1):
+    """
+    This generator yields fn_task(task) for every task, IN ORDER, either in this process (workers == 1) or from a process pool.
 
-def benchmark_words_file_to_list(fname, use_list_append, debug=False):
-    if debug:
-        s_append_list_mechanic = ("t += [x] idiom" if not use_list_append else S_LIST_APPEND_METHOD)
-        print(f"Benchmarking '{fname}' file to words list (using {s_append_list_mechanic})")
+    workers=None means one worker per core.
+    n_tasks_per_batch is how many tasks are shipped to a worker process at once (worth raising when there are many small tasks).
+    """
 
-    # timestamp for start of the execution of words_file_to_list()
-    t0 = time.time()
+    if workers is None:
+        workers = os.cpu_count() or 1
 
-    # execute words_file_to_list()
-    l_words = words_file_to_list(fname)
+    if workers > 1 and len(l_tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(l_tasks))) as executor:
+            yield from executor.map(fn_task, l_tasks, chunksize=n_tasks_per_batch)
+    else:
+        yield from map(fn_task, l_tasks)
 
-    # timestamp for end of the execution of words_file_to_list()
-    t1 = time.time()
+def bd_paradox_sim_chunk_task(t_args):
+    """
+    This function is the unit of work for both the single-process and the multi-process numpy engine (it has to live at module level so that worker processes can unpickle it).
 
-    # the delta is just the elapsed time
-    t_delta = (t1 - t0) + EPSILON
+    arguments:
+        t_args: a tuple of (seed_seq, n_sims, n_class_size, is_leap_year)
 
-    if debug:
-        print(f"\ttime elapsed (using {s_append_list_mechanic}): {t_delta} seconds") # CPU seconds elapsed (floating point)
+    returns:
+        the running count of duplicates within the chunk (int32 numpy array of length n_sims)
+    """
 
-    return t_delta, l_words
+    seed_seq, n_sims, n_class_size, is_leap_year = t_args
+    a_dups = bd_paradox_sim_chunk_dups(np.random.default_rng(seed_seq), n_sims, n_class_size, is_leap_year)
 
-def run_benchmark_words_file_to_list_series(fname, n_sims, debug=False):
-    n_list_append_more_efficient = 0
-    n_add_singleton_list_idiom_more_efficient = 0
+    return np.cumsum(a_dups, dtype=np.int32)
 
-    print(f"Running {n_sims} words_file_to_list() iterations...")
+class ConvergenceRecorder:
+    """
+    This class records the convergence curve of a simulation run (running probability y by simulation index x) in preallocated numpy arrays of a fixed size,
+        instead of one Python int and one float per simulation, so memory stays in kilobytes even for 10**8 simulations (and plotting takes milliseconds).
 
-    for i_sim in range(n_sims):
-        # benchmark using List.append()
-        tdelta__list_append, l_words = benchmark_words_file_to_list(fname, use_list_append=True, debug=debug)
+    mode:
+        "log":      y is kept at (about) n_points log-spaced simulation indices, which is where the curve actually changes
+        "minmax":   the simulations are split into n_points/2 equal-width buckets and the min and max y of every bucket are kept (and plotted), so no spike is lost
 
-        if debug:
-            print()
+    In both modes y is also kept (exactly) at the last simulation of every power of ten and at the last simulation (see y_at()).
 
-        # benchmark using the t += [x] idiom
-        tdelta__add_list_idiom, l_words = benchmark_words_file_to_list(fname, use_list_append=False, debug=debug)
+    Simulations can be recorded one at a time (record()) or a chunk at a time (record_chunk()), in order.
+    """
 
-        # the rest of this code is just for formatting the summary output when debugging
-        s_mech = ""
-        eff_factor = 0
+    __slots__ = ("n_sims", "mode", "a_pinned_x", "a_pinned_y", "i_next_pin", "n_next_pin_x", "n_buckets", "a_bucket_min_x", "a_bucket_min_y", "a_bucket_max_x", "a_bucket_max_y")
+
+    def __init__(self, n_sims, n_points=N_DEFAULT_CONVERGENCE_POINTS, mode="log"):
+        if mode not in S_CONVERGENCE_MODES:
+            raise ValueError(f"unknown convergence recording mode {mode!r} (expected one of {S_CONVERGENCE_MODES})")
+
+        self.n_sims = n_sims
+        self.mode = mode
+
+        l_pins = [10**e - 1 for e in range(len(str(n_sims))) if 10**e <= n_sims] + [n_sims - 1]
+        if mode == "log":
+            l_pins.extend(np.geomspace(1, n_sims, n_points).astype(np.int64) - 1)
+        self.a_pinned_x = np.unique(np.array(l_pins, dtype=np.int64))
+        self.a_pinned_y = np.full(len(self.a_pinned_x), np.nan)
+        self.i_next_pin = 0
+        self.n_next_pin_x = int(self.a_pinned_x[0])
+
+        self.n_buckets = min(n_points // 2, n_sims) if mode == "minmax" else 0 # (each bucket is plotted as 2 points)
+        self.a_bucket_min_x = np.zeros(self.n_buckets, dtype=np.int64)
+        self.a_bucket_min_y = np.full(self.n_buckets, np.inf)
+        self.a_bucket_max_x = np.zeros(self.n_buckets, dtype=np.int64)
+        self.a_bucket_max_y = np.full(self.n_buckets, -np.inf)
+
+    def record(self, i_sim, y):
+        if i_sim == self.n_next_pin_x:
+            self.a_pinned_y[self.i_next_pin] = y
+            self.i_next_pin += 1
+            self.n_next_pin_x = int(self.a_pinned_x[self.i_next_pin]) if self.i_next_pin < len(self.a_pinned_x) else -1
+
+        if self.n_buckets:
+            i_bucket = i_sim * self.n_buckets // self.n_sims
+            if y < self.a_bucket_min_y[i_bucket]:
+                self.a_bucket_min_x[i_bucket], self.a_bucket_min_y[i_bucket] = i_sim, y
+            if y > self.a_bucket_max_y[i_bucket]:
+                self.a_bucket_max_x[i_bucket], self.a_bucket_max_y[i_bucket] = i_sim, y
+
+    def record_chunk(self, i_start, a_y):
+        """
+        This method records the simulations i_start ... i_start+len(a_y)-1 at once.
+        """
+
+        i_end = i_start + len(a_y)
+
+        i_pin_end = int(np.searchsorted(self.a_pinned_x, i_end))
+        a_pins_x = self.a_pinned_x[self.i_next_pin:i_pin_end]
+        self.a_pinned_y[self.i_next_pin:i_pin_end] = a_y[a_pins_x - i_start]
+        self.i_next_pin = i_pin_end
+        self.n_next_pin_x = int(self.a_pinned_x[i_pin_end]) if i_pin_end < len(self.a_pinned_x) else -1
+
+        # a chunk spans few buckets (and a bucket few chunks), so we only loop over the bucket boundaries within the chunk
+        i_bucket = i_start * self.n_buckets // self.n_sims
+        i = i_start
+        while self.n_buckets and i < i_end:
+            i_bucket_end = min(-(-(i_bucket + 1) * self.n_sims // self.n_buckets), i_end)
+            a_y_bucket = a_y[i - i_start:i_bucket_end - i_start]
+            i_min, i_max = int(np.argmin(a_y_bucket)), int(np.argmax(a_y_bucket))
+            if a_y_bucket[i_min] < self.a_bucket_min_y[i_bucket]:
+                self.a_bucket_min_x[i_bucket], self.a_bucket_min_y[i_bucket] = i + i_min, a_y_bucket[i_min]
+            if a_y_bucket[i_max] > self.a_bucket_max_y[i_bucket]:
+                self.a_bucket_max_x[i_bucket], self.a_bucket_max_y[i_bucket] = i + i_max, a_y_bucket[i_max]
+            i = i_bucket_end
+            i_bucket += 1
+
+    def y_at(self, i_sim):
+        """
+        This method returns the (exact) running probability after simulation i_sim, which must be the last simulation of a power of ten or the last simulation.
+        """
+
+        i = int(np.searchsorted(self.a_pinned_x, i_sim))
+        if i == len(self.a_pinned_x) or self.a_pinned_x[i] != i_sim:
+            raise KeyError(i_sim)
+        return float(self.a_pinned_y[i])
+
+    def curve(self, n_sims=None):
+        """
+        This method returns the recorded curve as x and y numpy arrays (sorted by x), limited to the first n_sims simulations (None means all of them).
+        """
+
+        x, y = self.a_pinned_x, self.a_pinned_y
+        if self.n_buckets:
+            a_filled = np.isfinite(self.a_bucket_min_y)
+            x = np.concatenate((x, self.a_bucket_min_x[a_filled], self.a_bucket_max_x[a_filled]))
+            y = np.concatenate((y, self.a_bucket_min_y[a_filled], self.a_bucket_max_y[a_filled]))
+            x, i_unique = np.unique(x, return_index=True)
+            y = y[i_unique]
+
+        a_keep = ~np.isnan(y) if n_sims is None else ~np.isnan(y) & (x < n_sims)
+        return x[a_keep], y[a_keep]
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.a_pinned_x, self.a_pinned_y, self.a_bucket_min_x, self.a_bucket_min_y, self.a_bucket_max_x, self.a_bucket_max_y))
+
+def make_figure(figsize=(8,4), headless=False):
+    """
+    This function returns a new matplotlib figure.
 
-        # update summary and count of times the particular mechanic is more efficient
-        if tdelta__add_list_idiom < tdelta__list_append:
-            s_mech = S_ADD_SINGLETON_LIST_IDIOM
-            eff_factor = tdelta__list_append / tdelta__add_list_idiom
-            n_add_singleton_list_idiom_more_efficient += 1
-        else:
-            s_mech = S_LIST_APPEND_METHOD
-            eff_factor = tdelta__add_list_idiom / tdelta__list_append
-            n_list_append_more_efficient += 1
+    A headless figure is created directly (rather than through pyplot), so it never touches a GUI backend and can only be saved to a file (see show_or_save_figure()).
+    """
 
-        s_efficiency = f"{s_mech} is {eff_factor} more efficient!"
+    if headless:
+        from matplotlib.figure import Figure
+        return Figure(figsize=figsize)
 
-        if debug:
-            # print(f"\n{s_efficiency}\n\n{l_words}") # uncomment this to see l_words
-            print(f"\n{s_efficiency}")
+    import matplotlib.pyplot as plt
+    return plt.figure(figsize=figsize)
 
-    # always display summary after all simulations are complete
-    eff_ratio__list_append = n_list_append_more_efficient/n_sims
-    eff_ratio__add_singleton_list = 1 - eff_ratio__list_append
-    print(f"\tDONE: Out of {n_sims} iterations, {S_LIST_APPEND_METHOD} was more efficient {round(eff_ratio__list_append,2)*100}% of the time, while {S_ADD_SINGLETON_LIST_IDIOM} was more efficient {round(eff_ratio__add_singleton_list,2)*100}% of the time.")
+def show_or_save_figure(fig, fname_plot=None):
+    """
+    This function shows fig (which blocks until the window is closed) or, when fname_plot is given, renders it to that file (PNG, SVG, PDF... by extension) instead.
+    """
 
+    if fname_plot is None:
+        import matplotlib.pyplot as plt
+        plt.show()
+    else:
+        fig.savefig(fname_plot)
+        print(f"\t{fname_plot} written")
 
-def bisect(l, i_lb, i_ub, target_value, debug=False):
+def run_bd_paradox_sim_np(n_sims, n_class_size=N_DEFAULT_CLASS_SIZE, is_leap_year=False, rng=None, workers=1, recorder=None):
     """
-    This function implements what is also known as 'binary search'.
+    This function is the batched numpy engine behind run_bd_paradox_sim(..., use_numpy=True).
 
-    This implementation is based on RECURSION and is adapted from https://www.geeksforgeeks.org/python-program-for-binary-search/
+    Birthdays are drawn in chunks of at most N_BD_SIM_CHUNK_CELLS cells so that memory stays bounded no matter how large n_sims is,
+        and the running probability curve (y) is built with a cumulative sum rather than one Python division per simulation.
 
-    Even though the spec we are given indicates we can assume l is already sorted, we will double-check and do the sorting just in case.
+    Every chunk gets its own independent random stream, spawned from the root SeedSequence by chunk index.
+        So the chunks can be farmed out to a process pool (workers > 1) and the partial counts/curves merged back in chunk order,
+        which gives a result identical to a single-process run with the same seed, whatever the number of workers.
 
-    parameters:
-        l:      the list (elements should all be of the same type and comparable)
-        i_lb:   the index lower-bound of l to search
-        i_ub:   the index upper-bound of l to search
+    arguments:
+        n_sims
+        n_class_size
+        is_leap_year
+        rng:        a numpy.random.Generator or SeedSequence, or anything SeedSequence() accepts as a seed (None means fresh OS entropy)
+        workers:    the number of worker processes (None means one per core, 1 means run in this process)
+        recorder:   a ConvergenceRecorder to feed the curve to, chunk by chunk, instead of building the full curve (None means build the full curve)
 
-    From our spec:
-        'to check whether a <value> is in the list'
-        'returns the index of the value in the list, if it’s there, or None if it’s not'
+    returns:
+        p, x, y (same meaning as run_bd_paradox_sim(), but x and y are numpy arrays, decimated when a recorder is given)
     """
 
-    # short-circuit for 0-length and singleton lists, this is also the "base case" when recursion is used (but we will go the iteration route instead of recursion)
-    n = len(l)
-    if n == 0:
-        return None
-    if n == 1:
-        return 0 if l[0] == target_value else None
+    l_chunk_starts, l_tasks = bd_paradox_sim_chunk_tasks(n_sims, n_class_size, rng, n_class_size, is_leap_year)
 
-    # is_sorted check: avoid performance hit (checking if sorted only at top level) - i.e. only when i_lb==0 AND i_ub==len(l)-1
-    if i_lb==0 and i_ub==len(l)-1:
-        if not is_sorted(l):
-            if debug:
-                print("\tl is not sorted! sorting...")
-            l = sorted(l)
-            if debug:
-                # print(f"\t\tsorted l: {l}")
-                print(f"\t\tDONE")
-        print(f"\tbisecting l for target value -->{target_value}<-- ...")
+    if recorder is not None:
+        n_dups = 0
+        for i_chunk_start, a_n_dups in zip(l_chunk_starts, map_tasks(bd_paradox_sim_chunk_task, l_tasks, workers)):
+            recorder.record_chunk(i_chunk_start, (a_n_dups + n_dups) / np.arange(i_chunk_start + 1, i_chunk_start + len(a_n_dups) + 1))
+            n_dups += int(a_n_dups[-1])
+        return n_dups / n_sims, *recorder.curve()
 
-    # if we are here, we are guaranteed that l is sorted... now we can implement proper binary search logic
-    #   first step is to validate that i_ub >= i_lb
-    if i_ub >= i_lb:
-        
-        # since we are here, we can proceed with "bisecting"
-        #   so the first thing we need to do is find the midpoint between i_ub and i_lb: this is the basis of "bisection"
-        i_midpoint = (i_ub + i_lb) // 2     # integer division
+    y = np.empty(n_sims, dtype=np.float64)
 
-        val_at_midpoint = l[i_midpoint]
+    # the chunk results come back in chunk order, so each partial curve is simply offset by the duplicates counted in the chunks before it
+    n_dups = 0
+    for i_chunk_start, a_n_dups in zip(l_chunk_starts, map_tasks(bd_paradox_sim_chunk_task, l_tasks, workers)):
+        y_chunk = y[i_chunk_start:i_chunk_start + len(a_n_dups)]
+        y_chunk[:] = a_n_dups
+        y_chunk += n_dups
+        n_dups += int(a_n_dups[-1])
 
-        if debug:
-            print(f"\t\tmidpoint (index) of l between index {i_lb} and {i_ub} is: {i_midpoint} and l[{i_midpoint}]=={val_at_midpoint}")
-        
-        # if target_value is at index i_midpoint, return i_midpoint
-        if val_at_midpoint == target_value:
-            if debug:
-                print(f"\t\ttarget value -->{target_value}<-- found at midpoint index {i_midpoint}")
+    x = np.arange(n_sims)
+    y /= np.arange(1, n_sims + 1)
+
+    return n_dups / n_sims, x, y
+
+def bd_paradox_exact_p(n_class_size, is_leap_year=False):
+    """
+    This function computes the exact (analytic) probability that at least 2 students in a class of n_class_size share a birthday:
+        p = 1 - (d/d) * ((d-1)/d) * ... * ((d-n+1)/d), where d is the number of days in the year
+    """
+
+    n_days = N_DAYS_IN_YEAR + (1 if is_leap_year else 0)
+
+    p_no_dups = 1.0
+    for k in range(min(n_class_size, n_days + 1)):
+        p_no_dups *= (n_days - k) / n_days
+
+    return 1 - p_no_dups
+
+def bd_paradox_sim_chunk_first_collision_task(t_args):
+    """
+    This function is the unit of work of run_bd_paradox_sim_curve_np().
+
+    Every simulation draws n_max_class_size birthdays in order, i.e. students "enter the classroom" one at a time, and we record the class size at which the first shared birthday appears.
+        A class of size n has a duplicate exactly when that first collision happens at a size <= n, so one set of draws answers the question for EVERY class size.
+
+    arguments:
+        t_args: a tuple of (seed_seq, n_sims, n_max_class_size, is_leap_year)
+
+    returns:
+        the histogram of first-collision class sizes (int64 numpy array of length n_max_class_size+2, where the last bin counts simulations with no collision at all)
+    """
+
+    seed_seq, n_sims, n_max_class_size, is_leap_year = t_args
+    n_days = N_DAYS_IN_YEAR + (1 if is_leap_year else 0)
+
+    rng = np.random.default_rng(seed_seq)
+    a_birthdays = rng.integers(1, n_days + 1, size=(n_sims, n_max_class_size), dtype=np.uint32)
+
+    # pack (birthday, position) into a single key so that a plain sort of each row orders students by birthday and then by arrival
+    #   the later student of every equal adjacent pair is a repeat, and the earliest repeat is the first collision
+    a_keys = a_birthdays * n_max_class_size + np.arange(n_max_class_size, dtype=np.uint32)
+    a_keys.sort(axis=1)
+    a_is_repeat = (a_keys[:, 1:] // n_max_class_size) == (a_keys[:, :-1] // n_max_class_size)
+    a_positions = np.where(a_is_repeat, a_keys[:, 1:] % n_max_class_size, n_max_class_size)
+
+    # position is 0-based, so the class size at which the collision happens is position+1 (and n_max_class_size+1 means "never")
+    a_first_collision = a_positions.min(axis=1) + 1 if n_max_class_size > 1 else np.full(n_sims, 2)
+
+    return np.bincount(a_first_collision, minlength=n_max_class_size + 2)
+
+def run_bd_paradox_sim_curve_np(n_sims, n_max_class_size=100, is_leap_year=False, rng=None, workers=1):
+    """
+    This function estimates the Birthday Paradox probability for every class size from 1 to n_max_class_size out of ONE set of n_sims simulations
+        (see bd_paradox_sim_chunk_first_collision_task()), instead of running a separate set of simulations for each class size.
+
+    The exact (analytic) probability is returned alongside, which gives a reference to check convergence against without running more simulations.
+
+    Chunking, seeding and workers behave as in run_bd_paradox_sim_np().
+
+    returns:
+        1. the class sizes (numpy array: 1 ... n_max_class_size)
+        2. the simulated probability for each class size
+        3. the exact probability for each class size
+    """
+
+    n_days = N_DAYS_IN_YEAR + (1 if is_leap_year else 0)
+
+    # by the pigeonhole principle a class of n_days+1 students always has a collision, so there is no point drawing more than that
+    n_max_class_size = min(n_max_class_size, n_days + 1)
+
+    _, l_tasks = bd_paradox_sim_chunk_tasks(n_sims, n_max_class_size, rng, n_max_class_size, is_leap_year)
+
+    a_hist = np.zeros(n_max_class_size + 2, dtype=np.int64)
+    for a_chunk_hist in map_tasks(bd_paradox_sim_chunk_first_collision_task, l_tasks, workers):
+        a_hist += a_chunk_hist
+
+    a_class_sizes = np.arange(1, n_max_class_size + 1)
+    a_p_sim = np.cumsum(a_hist[1:n_max_class_size + 1]) / n_sims
+    a_p_exact = np.array([bd_paradox_exact_p(n, is_leap_year) for n in a_class_sizes])
+
+    return a_class_sizes, a_p_sim, a_p_exact
+
+def run_bd_paradox_sim_curve(n_sims, n_max_class_size=100, is_leap_year=False, rng=None, workers=1, do_plot=True, fname_plot=None):
+    print(f"Running {n_sims} Birthday Paradox simulations for every class size from 1 to {n_max_class_size} students...")
+    a_class_sizes, a_p_sim, a_p_exact = run_bd_paradox_sim_curve_np(n_sims, n_max_class_size=n_max_class_size, is_leap_year=is_leap_year, rng=rng, workers=workers)
+    i_max_err = int(np.argmax(np.abs(a_p_sim - a_p_exact)))
+    print(f"\tDONE: The largest deviation from the exact probability is {abs(a_p_sim[i_max_err] - a_p_exact[i_max_err])} (class size {a_class_sizes[i_max_err]}: simulated {a_p_sim[i_max_err]}, exact {a_p_exact[i_max_err]}).")
+
+    if do_plot:
+        fig = make_figure(headless=fname_plot is not None)
+        axis = fig.subplots()
+        axis.plot(a_class_sizes, a_p_sim, label="simulated")
+        axis.plot(a_class_sizes, a_p_exact, linestyle="--", label="exact")
+        axis.set_title(f"Birthday Paradox: P(shared birthday) by class size ({n_sims} sims)")
+        axis.legend()
+        show_or_save_figure(fig, fname_plot)
+
+    return a_class_sizes, a_p_sim, a_p_exact
+
+def test_bd_paradox_sim_curve(n_sims, n_max_class_size=100, seed=0):
+    """
+    This test checks run_bd_paradox_sim_curve_np() against the exact curve it returns (and the exact curve against known values):
+        the simulated probability of every class size is within 5 standard errors of the exact one (the standard error of the exact probability,
+        plus one simulation's worth, 1/n_sims, since near p=0 or p=1 a single simulation is already many standard errors), both curves never decrease,
+        a class of 1 never has a shared birthday, and a class of 23 (the famous one) has an exact probability of 0.5073 (to 4 places).
+        It also checks that the simulated curve does not depend on the number of workers, and that a class of n_days+1 always has a shared birthday.
+    """
+
+    a_class_sizes, a_p_sim, a_p_exact = run_bd_paradox_sim_curve_np(n_sims, n_max_class_size=n_max_class_size, rng=seed)
+
+    b_within = bool(np.all(np.abs(a_p_sim - a_p_exact) <= 5 * np.sqrt(a_p_exact * (1 - a_p_exact) / n_sims) + 1 / n_sims))
+    b_shape = bool(np.all(np.diff(a_p_sim) >= 0) and np.all(np.diff(a_p_exact) >= 0)) and a_p_sim[0] == 0 and a_p_exact[0] == 0 and round(bd_paradox_exact_p(23), 4) == 0.5073
+    b_workers = np.array_equal(run_bd_paradox_sim_curve_np(n_sims, n_max_class_size=n_max_class_size, rng=seed, workers=2)[1], a_p_sim)
+    b_pigeonhole = run_bd_paradox_sim_curve_np(1000, n_max_class_size=N_DAYS_IN_YEAR + 10, rng=seed)[1][-1] == 1.0
+
+    b_result = b_within and b_shape and b_workers and b_pigeonhole
+    print(f"\tTEST run_bd_paradox_sim_curve_np(n_sims={n_sims}, n_max_class_size={n_max_class_size}) simulated curve == exact curve (within 5 standard errors): {b_result}")
+
+def binomial_confidence_interval(n_successes, n_trials, confidence=0.95):
+    """
+    This function computes the Wilson score interval for a binomial proportion.
+
+    Unlike the textbook (Wald) interval p +/- z*sqrt(p(1-p)/n), the Wilson interval behaves well near p=0 and p=1 and for small n,
+        which matters here since e.g. tiny class sizes have p very close to 0.
+
+    returns:
+        p_lo, p_hi
+    """
+
+    z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+    p = n_successes / n_trials
+    z2_n = z*z / n_trials
+
+    center = (p + z2_n/2) / (1 + z2_n)
+    half_width = (z / (1 + z2_n)) * math.sqrt(p*(1 - p)/n_trials + z2_n/(4*n_trials))
+
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+def run_bd_paradox_sim_adaptive(tolerance=0.001, confidence=0.95, n_class_size=N_DEFAULT_CLASS_SIZE, is_leap_year=False, rng=None, n_max_sims=N_BD_SIM_ADAPTIVE_MAX_SIMS):
+    """
+    This function runs Birthday Paradox simulations (numpy engine) only until the estimate is precise enough, instead of a fixed number of simulations.
+
+    After every batch, the Wilson confidence interval of the running estimate is computed, and we stop as soon as its half-width is <= tolerance (or n_max_sims is reached).
+        The next batch is sized from the current estimate (n ~ z^2 * p(1-p) / tolerance^2) but at least doubles the simulations run so far,
+        so only a handful of checks happen (which also keeps the optional-stopping bias of the interval negligible).
+
+    arguments:
+        tolerance:      the target half-width of the confidence interval
+        confidence:     the confidence level of the interval (e.g. 0.95)
+        n_class_size
+        is_leap_year
+        rng:            as in run_bd_paradox_sim_np()
+        n_max_sims:     hard cap on the number of simulations
+
+    returns:
+        1. the estimate p
+        2. the confidence interval (p_lo, p_hi)
+        3. the number of simulations actually run
+    """
+
+    if n_max_sims < 1:
+        raise ValueError(f"n_max_sims must be at least 1 (got {n_max_sims})")
+    if not 0 < confidence < 1:
+        raise ValueError(f"confidence must be in (0, 1) (got {confidence})")
+    if not tolerance > 0:
+        raise ValueError(f"tolerance must be > 0 (got {tolerance})")
+
+    print(f"Running Birthday Paradox simulations on a class size of {n_class_size} students until the {confidence*100:g}% confidence interval is within +/-{tolerance}...")
+
+    rng = np.random.default_rng(bd_paradox_sim_seed_seq(rng))
+    z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+    n_chunk_sims = max(1, N_BD_SIM_CHUNK_CELLS // max(n_class_size, 1))
+
+    n_sims = 0
+    n_dups = 0
+    n_batch = min(N_BD_SIM_ADAPTIVE_MIN_BATCH, n_max_sims)
+    while n_batch > 0:
+        # draw the batch in bounded chunks
+        for i_chunk_start in range(0, n_batch, n_chunk_sims):
+            n_dups += int(np.count_nonzero(bd_paradox_sim_chunk_dups(rng, min(n_chunk_sims, n_batch - i_chunk_start), n_class_size, is_leap_year)))
+        n_sims += n_batch
+
+        p_lo, p_hi = binomial_confidence_interval(n_dups, n_sims, confidence)
+        if (p_hi - p_lo) / 2 <= tolerance:
+            break
+
+        # size the next batch from what the current estimate says we still need (but at least double, and never beyond n_max_sims)
+        p = n_dups / n_sims
+        n_needed = math.ceil(z*z * max(p*(1 - p), 1/n_sims) / (tolerance*tolerance))
+        n_batch = min(max(n_needed - n_sims, n_sims), n_max_sims - n_sims)
+
+    p = n_dups / n_sims
+    print(f"\tDONE: The probability that at least 2 students from a class size of {n_class_size} have the same birthday converged to {p} (interval [{p_lo}, {p_hi}]) after {n_sims} simulations.")
+
+    return p, (p_lo, p_hi), n_sims
+
+def benchmark_bd_paradox_sim_scaling(n_sims, l_workers=None, n_class_size=N_DEFAULT_CLASS_SIZE, seed=0):
+    """
+    This function reports how well the multi-process numpy engine scales across cores.
+
+    It times run_bd_paradox_sim_np() once per worker count (with the same seed, so every run must produce the same p) and prints the speedup and parallel efficiency relative to 1 worker.
+
+    returns:
+        a list of dictionaries (one per worker count) with keys: workers, seconds, speedup, efficiency, p
+    """
+
+    if l_workers is None:
+        n_cores = os.cpu_count() or 1
+        l_workers = sorted(set([2**i for i in range(n_cores.bit_length()) if 2**i <= n_cores] + [n_cores]))
+
+    print(f"Benchmarking {n_sims} Birthday Paradox simulations (class size {n_class_size}) across {l_workers} workers...")
+
+    l_results = []
+    t_baseline = None
+    for n_workers in l_workers:
+        t0 = time.perf_counter()
+        p, _, _ = run_bd_paradox_sim_np(n_sims, n_class_size=n_class_size, rng=seed, workers=n_workers)
+        t_delta = time.perf_counter() - t0
+
+        if t_baseline is None:
+            t_baseline = t_delta * l_workers[0]    # normalize to a (notional) single worker in case the sweep does not start at 1
+        speedup = t_baseline / t_delta
+        l_results.append({"workers": n_workers, "seconds": t_delta, "speedup": speedup, "efficiency": speedup / n_workers, "p": p})
+        print(f"\tworkers={n_workers}:\t{t_delta:0.3f} seconds\tspeedup={speedup:0.2f}x\tefficiency={(speedup / n_workers)*100:0.1f}%\tp={p}")
+
+    if len(set([d["p"] for d in l_results])) > 1:
+        print("\t***WARNING***: results differ across worker counts!")
+
+    return l_results
+
+def run_bd_paradox_sim(n_sims, n_class_size=N_DEFAULT_CLASS_SIZE, is_leap_year=False, use_numpy=False, rng=None, workers=1, recorder=None):
+    print(f"Running {n_sims} Birthday Paradox simulations on a class size of {n_class_size} students{' (numpy engine)' if use_numpy else ''}...")
+    if use_numpy:
+        p, x, y = run_bd_paradox_sim_np(n_sims, n_class_size=n_class_size, is_leap_year=is_leap_year, rng=rng, workers=workers, recorder=recorder)
+    elif recorder is not None:
+        n_dups = 0
+        for i_sim in range(n_sims):
+            l_birthdays = [random.randint(1, N_DAYS_IN_YEAR + (1 if is_leap_year else 0)) for i in range(n_class_size)]
+            n_dups += 1 if has_duplicates(l_birthdays) else 0
+            recorder.record(i_sim, n_dups / (i_sim+1))
+        p = n_dups / n_sims
+        x, y = recorder.curve()
+    else:
+        p = 0
+        n_dups = 0
+        x = []
+        y = []
+        for i_sim in range(n_sims):
+            l_birthdays = [random.randint(1, N_DAYS_IN_YEAR + (1 if is_leap_year else 0)) for i in range(n_class_size)]
+            n_dups += 1 if has_duplicates(l_birthdays) else 0
+            x.append(i_sim)
+            y.append(n_dups / (i_sim+1))
+        p = n_dups / n_sims
+    print(f"\tDONE: The probability that at least 2 students from a class size of {n_class_size} have the same birthday converged to {p} after {n_sims} simulations.")
+
+    return p, x, y
+
+def run_bd_paradox_sim_series(n_powers_of_ten, n_class_size=N_DEFAULT_CLASS_SIZE, is_leap_year=False, do_plot=True, use_numpy=False, rng=None, workers=1, reuse_draws=False, recorder_mode=None, n_points=N_DEFAULT_CONVERGENCE_POINTS, fname_plot=None):
+    """
+    Runs 10**1 ... 10**n_powers_of_ten simulations (and plots the convergence of each).
+
+    With the numpy engine (use_numpy=True), reuse_draws=True runs only the largest simulation and reads every smaller one off its prefix
+        (the first 10**e simulations of the largest run ARE a run of 10**e simulations), so the whole series costs about as much as its largest member.
+
+    recorder_mode ("log" or "minmax", see ConvergenceRecorder) records each convergence curve decimated to about n_points points instead of one point per simulation.
+    fname_plot renders the figure to that file (headless) instead of showing it.
+    """
+
+    exponents = list(range(1,n_powers_of_ten+1))
+
+    # a single generator is shared across the series so that a seeded run is reproducible end to end
+    if use_numpy and not isinstance(rng, np.random.Generator):
+        rng = np.random.default_rng(rng)
+
+    n_cols = 2
+    n_rows = len(exponents) // n_cols
+    if do_plot:
+        fig = make_figure(headless=fname_plot is not None)
+        axes = fig.subplots(n_rows, n_cols, squeeze=False)
+
+    if use_numpy and reuse_draws:
+        recorder = ConvergenceRecorder(10**exponents[-1], n_points, recorder_mode) if recorder_mode is not None else None
+        _, x_all, y_all = run_bd_paradox_sim(n_sims=10**exponents[-1], n_class_size=n_class_size, is_leap_year=is_leap_year, use_numpy=True, rng=rng, workers=workers, recorder=recorder)
+
+    for i, e in enumerate(exponents):
+        n_sims = 10**e
+        if use_numpy and reuse_draws and recorder is not None:
+            x, y = recorder.curve(n_sims)
+            p = recorder.y_at(n_sims - 1)
+        elif use_numpy and reuse_draws:
+            x, y = x_all[:n_sims], y_all[:n_sims]
+            p = float(y[-1])
+        else:
+            recorder = ConvergenceRecorder(n_sims, n_points, recorder_mode) if recorder_mode is not None else None
+            p, x, y = run_bd_paradox_sim(n_sims=n_sims, n_class_size=n_class_size, is_leap_year=is_leap_year, use_numpy=use_numpy, rng=rng, workers=workers, recorder=recorder)
+        if do_plot:
+            axis = axes[i//n_cols][i%n_cols]
+            axis.set_title(f"# sims = {n_sims}, p = {p}")
+            axis.plot(x, y)
+
+    if do_plot:
+        fig.tight_layout()
+        show_or_save_figure(fig, fname_plot)
+
+
+def remove_duplicates(l, preserve_order=False):
+    """
+    This function returns a new list with only the unique elements of l (l itself is not modified; a string is treated as a list of chars).
+
+    arguments:
+        l
+        preserve_order: when False (the default), the unique elements are returned in sorted order (as they always have been)
+                        when True, they are returned in the order in which they first appear in l
+
+    Uniqueness is determined with a set/dictionary in O(n) (plus sorting the unique elements only, when preserve_order is False).
+        If the elements turn out to be unhashable (e.g. lists), we fall back to the sort-based remove_duplicates__sorted().
+        The elements of a SortedList are already in both orders, so only the first element of each run of equal elements is kept.
+    """
+
+    if isinstance(l, SortedList):
+        return [e for e, _ in groupby(l)]
+
+    try:
+        if preserve_order:
+            return list(dict.fromkeys(l))   # dictionaries remember insertion order, and fromkeys() keeps the first occurrence
+        return sorted(set(l))
+    except TypeError:   # unhashable element
+        return remove_duplicates__sorted(l, preserve_order=preserve_order)
+
+def remove_duplicates__sorted(l, preserve_order=False):
+    """
+    This is the sort-based version of remove_duplicates(): O(n log n), but it works for any elements that can be compared (hashable or not).
+    """
+
+    l = str_to_list(l)  # in case l is a string
+
+    n = len(l)
+
+    # a 0 or single element list is already implicitly sorted, so we can short-circuit
+    if n < 2:
+        return l
+
+    if preserve_order:
+        # sort the INDICES by element (sorted() is stable, so within a run of equal elements the first occurrence comes first)
+        #   then keep the first index of each run and put the survivors back in their original order
+        l_i_sorted = sorted(range(n), key=l.__getitem__)
+        l_i_kept = [l_i_sorted[0]] + [l_i_sorted[j] for j in range(1, n) if l[l_i_sorted[j]] != l[l_i_sorted[j-1]]]
+        return [l[i] for i in sorted(l_i_kept)]
+
+    # here we sort the list
+    #   this greatly simplifies the problem compared to not sorting
+    if not is_sorted(l):
+        l = sorted(l)
+
+    l_dups_removed = []
+    
+    # iterate from index 0 to len(l)-2
+    #   only add the last non-repeating element, which we can do since the list has been sorted
+    for i in range(n-1): # recall that n-1 is not inclusive when using range()
+        if l[i] != l[i+1]:
+            l_dups_removed.append(l[i])
+
+    # but we still have the very last index to add
+    #   this works since if there was a dup at the n-2 index, it will not have been added to l_dups_removed
+    l_dups_removed.append(l[n-1])
+
+    return l_dups_removed
+
+def test_remove_duplicates(l, preserve_order=False):
+    b_result = remove_duplicates(l, preserve_order=preserve_order)
+    print(f"\tTEST remove_duplicates(l={l}{', preserve_order=True' if preserve_order else ''}): {b_result}")
+
+def test_duplicates_vs_sorted(l, s_name):
+    """
+    This test checks that the hash-based has_duplicates() and remove_duplicates() (in both orders) agree with their sort-based versions on l.
+    """
+
+    b_result = all(has_duplicates(l, disregard_char_case=b) == has_duplicates__sorted(l, disregard_char_case=b) for b in (False, True)) \
+        and all(remove_duplicates(l, preserve_order=b) == remove_duplicates__sorted(l, preserve_order=b) for b in (False, True))
+    print(f"\tTEST has_duplicates()/remove_duplicates() == their sort-based versions (l={s_name}): {b_result}")
+
+
+def words_file_to_list(fname, use_list_append=True):
+    l_words = []
+
+    try:
+        with instrumented_stage("read"), open(fname, 'r') as f_words:
+            for words_line in f_words:
+                for word in words_line.split():
+                    if use_list_append:
+                        l_words.append(word.strip()) # dynamically resizes 
+                    else:
+                        l_words += [word] # adding to separate lists (which exist in two different places in memory)
+            count_metric("bytes_read", os.fstat(f_words.fileno()).st_size)
+            f_words.close()
+    except Exception as e:
+        print(f"words_file_to_list: ***RUNTIME ERROR caught***: {e}")
+
+    count_metric("tokens_read", len(l_words))
+
+    return l_words
+
+def iter_word_aligned_chunks(it_text_chunks):
+    """
+    This generator takes arbitrary pieces of text (e.g. fixed-size reads) and yields them re-cut so that no piece ever splits a word.
+
+    A word that straddles a boundary (i.e. the piece does not end with whitespace) is held back and prepended to the next piece.
+        So concatenating everything yielded gives back the whole text, and str.split() on each piece gives exactly the tokens str.split() would give on the whole text.
+    """
+
+    s_carry = ""
+    for s_chunk in it_text_chunks:
+        if not s_chunk:
+            continue
+
+        s_chunk = s_carry + s_chunk
+
+        if s_chunk[-1].isspace():
+            s_carry = ""
+        else:
+            # the trailing (possibly partial) word is the last whitespace-delimited token
+            s_partial_word = s_chunk.rsplit(None, 1)[-1]
+            s_carry = s_chunk[len(s_chunk) - len(s_partial_word):]
+            s_chunk = s_chunk[:len(s_chunk) - len(s_partial_word)]
+
+        if s_chunk:
+            yield s_chunk
+
+    if s_carry:
+        yield s_carry
+
+def iter_file_text_chunks(fname, n_chunk_size=N_DEFAULT_CHUNK_SIZE):
+    """
+    This generator reads a text file n_chunk_size chars at a time and yields the text in pieces that never split a word (see iter_word_aligned_chunks()).
+
+    Memory is bounded by n_chunk_size (plus the length of the longest word), not by the size of the file.
+    """
+
+    try:
+        with open(fname, 'r') as f_words:
+            yield from iter_word_aligned_chunks(iter(lambda: f_words.read(n_chunk_size), ""))
+            count_metric("bytes_read", os.fstat(f_words.fileno()).st_size)
+    except Exception as e:
+        print(f"iter_file_text_chunks: ***RUNTIME ERROR caught***: {e}")
+
+def benchmark_words_file_to_list(fname, use_list_append, debug=False):
+    if debug:
+        s_append_list_mechanic = ("t += [x] idiom" if not use_list_append else S_LIST_APPEND_METHOD)
+        print(f"Benchmarking '{fname}' file to words list (using {s_append_list_mechanic})")
+
+    # timestamp (in ns, from the highest resolution clock available) for start of the execution of words_file_to_list()
+    t0 = time.perf_counter_ns()
+
+    # execute words_file_to_list() with the list-building mechanic being benchmarked
+    l_words = words_file_to_list(fname, use_list_append=use_list_append)
+
+    # timestamp for end of the execution of words_file_to_list()
+    t1 = time.perf_counter_ns()
+
+    # the delta is just the elapsed time (converted to seconds)
+    t_delta = (t1 - t0) / 1e9 + EPSILON
+
+    if debug:
+        print(f"\ttime elapsed (using {s_append_list_mechanic}): {t_delta} seconds") # CPU seconds elapsed (floating point)
+
+    return t_delta, l_words
+
+def run_benchmark_words_file_to_list_series(fname, n_sims, debug=False):
+    n_list_append_more_efficient = 0
+    n_add_singleton_list_idiom_more_efficient = 0
+
+    print(f"Running {n_sims} words_file_to_list() iterations...")
+
+    for i_sim in range(n_sims):
+        # benchmark using List.append()
+        tdelta__list_append, l_words = benchmark_words_file_to_list(fname, use_list_append=True, debug=debug)
+
+        if debug:
+            print()
+
+        # benchmark using the t += [x] idiom
+        tdelta__add_list_idiom, l_words = benchmark_words_file_to_list(fname, use_list_append=False, debug=debug)
+
+        # the rest of this code is just for formatting the summary output when debugging
+        s_mech = ""
+        eff_factor = 0
+
+        # update summary and count of times the particular mechanic is more efficient
+        if tdelta__add_list_idiom < tdelta__list_append:
+            s_mech = S_ADD_SINGLETON_LIST_IDIOM
+            eff_factor = tdelta__list_append / tdelta__add_list_idiom
+            n_add_singleton_list_idiom_more_efficient += 1
+        else:
+            s_mech = S_LIST_APPEND_METHOD
+            eff_factor = tdelta__add_list_idiom / tdelta__list_append
+            n_list_append_more_efficient += 1
+
+        s_efficiency = f"{s_mech} is {eff_factor} more efficient!"
+
+        if debug:
+            # print(f"\n{s_efficiency}\n\n{l_words}") # uncomment this to see l_words
+            print(f"\n{s_efficiency}")
+
+    # always display summary after all simulations are complete
+    eff_ratio__list_append = n_list_append_more_efficient/n_sims
+    eff_ratio__add_singleton_list = 1 - eff_ratio__list_append
+    print(f"\tDONE: Out of {n_sims} iterations, {S_LIST_APPEND_METHOD} was more efficient {round(eff_ratio__list_append,2)*100}% of the time, while {S_ADD_SINGLETON_LIST_IDIOM} was more efficient {round(eff_ratio__add_singleton_list,2)*100}% of the time.")
+
+
+def bisect(l, i_lb, i_ub, target_value, debug=False):
+    """
+    This function implements what is also known as 'binary search'.
+
+    This implementation is based on RECURSION and is adapted from https://www.geeksforgeeks.org/python-program-for-binary-search/
+
+    Even though the spec we are given indicates we can assume l is already sorted, we will double-check and do the sorting just in case.
+
+    parameters:
+        l:      the list (elements should all be of the same type and comparable)
+        i_lb:   the index lower-bound of l to search
+        i_ub:   the index upper-bound of l to search
+
+    From our spec:
+        'to check whether a <value> is in the list'
+        'returns the index of the value in the list, if it’s there, or None if it’s not'
+    """
+
+    # a SortedList is sorted by construction, so we search its elements directly and skip the is_sorted check below
+    b_is_sorted_list = isinstance(l, SortedList)
+    if b_is_sorted_list:
+        l = l.l
+
+    # short-circuit for 0-length and singleton lists, this is also the "base case" when recursion is used (but we will go the iteration route instead of recursion)
+    n = len(l)
+    if n == 0:
+        return None
+    if n == 1:
+        return 0 if l[0] == target_value else None
+
+    # is_sorted check: avoid performance hit (checking if sorted only at top level) - i.e. only when i_lb==0 AND i_ub==len(l)-1
+    if i_lb==0 and i_ub==len(l)-1:
+        if not b_is_sorted_list and not is_sorted(l):
+            if debug:
+                print("\tl is not sorted! sorting...")
+            l = sorted(l)
+            if debug:
+                # print(f"\t\tsorted l: {l}")
+                print(f"\t\tDONE")
+        if debug:
+            print(f"\tbisecting l for target value -->{target_value}<-- ...")
+
+    # if we are here, we are guaranteed that l is sorted... now we can implement proper binary search logic
+    #   first step is to validate that i_ub >= i_lb
+    if i_ub >= i_lb:
+        
+        # since we are here, we can proceed with "bisecting"
+        #   so the first thing we need to do is find the midpoint between i_ub and i_lb: this is the basis of "bisection"
+        i_midpoint = (i_ub + i_lb) // 2     # integer division
+
+        val_at_midpoint = l[i_midpoint]
+
+        if debug:
+            print(f"\t\tmidpoint (index) of l between index {i_lb} and {i_ub} is: {i_midpoint} and l[{i_midpoint}]=={val_at_midpoint}")
+        
+        # if target_value is at index i_midpoint, return i_midpoint
+        if val_at_midpoint == target_value:
+            if debug:
+                print(f"\t\ttarget value -->{target_value}<-- found at midpoint index {i_midpoint}")
             return i_midpoint
 
-        else:   # we have already excluded the equality case
+        else:   # we have already excluded the equality case
+
+            # now we use the fact that elements in l are comparable... this happens recursively
+            if target_value < val_at_midpoint:  # then we look in the left half... this is the binary split
+                return bisect(l, i_lb, i_midpoint - 1, target_value, debug)   # the midpoint itself has already been excluded
+
+            else:   # otherwise we look in the right half... this happens recursively
+                return bisect(l, i_midpoint + 1, i_ub, target_value, debug)
+
+    else: # i_ub < i_lb  (which is illogical, therefore return None)
+        return None
+
+def test_bisect(l, i_lb, i_ub, target_value, debug=True):
+    result = bisect(l, i_lb, i_ub, target_value, debug=debug)
+    print(f"\tTEST bisect(l={l if len(l)<50 else '<l contents SUPRESSED due to length>'}, i_lb={i_lb}, i_ub={i_ub}, target_value={target_value}): {result}")
+
+
+def test_sorted_list(l, s_name, typecode=None):
+    """
+    This test checks that giving a SortedList of l (instead of l itself) to the functions that accept one changes nothing but the speed:
+        is_sorted(), is_anagram(), has_duplicates(), remove_duplicates(), bisect() and bisect_many() give the same answers,
+        and add(), update() and remove() keep the elements sorted.
+    """
+
+    sorted_list = SortedList(l, typecode=typecode)
+    l_sorted = sorted(l)
+    l_targets = l_sorted[::max(1, len(l_sorted) // 20)] + l_sorted[-1:]
+    l_shuffled = random.Random(0).sample(l, len(l))
+
+    b_queries = is_sorted(sorted_list) and list(sorted_list) == l_sorted \
+        and is_anagram(sorted_list, SortedList(l_shuffled, typecode=typecode)) == is_anagram(l, l_shuffled) \
+        and all(has_duplicates(sorted_list, disregard_char_case=b) == has_duplicates(l, disregard_char_case=b) for b in (False, True)) \
+        and remove_duplicates(sorted_list) == remove_duplicates(l) \
+        and all(l_sorted[bisect(sorted_list, 0, len(sorted_list)-1, target)] == target for target in l_targets) \
+        and bisect_many(sorted_list, l_targets) == bisect_many(l_sorted, l_targets, assume_sorted=True)
+
+    for e in l_sorted[:3]:
+        sorted_list.add(e)
+    sorted_list.update(l_sorted[-3:])
+    sorted_list.remove(l_sorted[0])
+    b_mutations = list(sorted_list) == sorted(l_sorted + l_sorted[1:3] + l_sorted[-3:])
+
+    b_result = b_queries and b_mutations
+    print(f"\tTEST SortedList(l={s_name}{f', typecode={typecode!r}' if typecode else ''}) answers == plain list answers: {b_result}")
+
+def iter_batches(it, n_batch_size):
+    """
+    This generator groups the elements of any iterable into lists of (at most) n_batch_size elements, without ever materializing the whole iterable.
+    """
+
+    it = iter(it)
+    while True:
+        l_batch = list(islice(it, n_batch_size))
+        if not l_batch:
+            return
+        yield l_batch
+
+def iter_bisect_many(l, targets, strategy="auto", n_batch_size=N_DEFAULT_LOOKUP_BATCH_SIZE, assume_sorted=False):
+    """
+    This generator is the bulk (many targets at once) counterpart of bisect(): for every target, IN ORDER, it yields the index of the target in l, or None if it is not there.
+
+    Targets are consumed n_batch_size at a time, so targets can be a generator (e.g. the tokens of a file much larger than memory).
+        For each batch, one of these strategies is used:
+            "bisect":       one binary search (bisect.bisect_left()) per target: O(m log n), nothing to build, best for small batches
+            "merge":        sorted merge-join: the batch is sorted and walked alongside l, each search starting where the previous one stopped
+            "hash":         a dictionary {value: index} is built ONCE (O(n), then shared by every batch) and each target is an O(1) probe, best for big batches
+            "searchsorted": vectorized numpy.searchsorted() over the whole batch (best for numeric targets)
+            "auto":         picks "searchsorted" for numeric numpy targets, and otherwise "hash" as soon as the (running) number of targets
+                                makes building the dictionary cheaper than binary searching (roughly m > n/3 for a million-word list), "bisect" before that
+
+    Unlike bisect() (which returns the index of any one of equal elements), every strategy returns the index of the FIRST occurrence.
+
+    arguments:
+        l:              a sorted list (or a SortedList, a WordIndex, or a CorpusStore); as with bisect(), an unsorted list is sorted first (unless assume_sorted) and indices refer to the sorted list
+        targets:        any iterable (or numpy array) of targets
+        strategy:       one of S_BISECT_MANY_STRATEGIES
+        n_batch_size
+        assume_sorted:  skip the O(n) is_sorted() check of l
+    """
+
+    if strategy not in S_BISECT_MANY_STRATEGIES:
+        raise ValueError(f"unknown strategy '{strategy}' (expected one of {S_BISECT_MANY_STRATEGIES})")
+
+    if isinstance(l, CorpusStore):
+        for l_batch in iter_batches(targets, n_batch_size):
+            yield from map(l.find, l_batch)
+        return
+    if isinstance(l, SortedList):
+        l, assume_sorted = l.l, True
+    b_is_word_index = isinstance(l, WordIndex)
+    if not b_is_word_index and not assume_sorted and not is_sorted(l):
+        l = sorted(l)
+    n = len(l)
+
+    # lookup structures are only built if a strategy needs them, and then reused by every batch
+    d_first_index = None
+    a_l = None
+
+    n_targets_so_far = 0
+    for l_batch in iter_batches(targets, n_batch_size):
+        n_targets_so_far += len(l_batch)
+
+        s_strategy = strategy
+        if s_strategy == "auto":
+            if isinstance(targets, np.ndarray) and targets.dtype.kind in "iuf":
+                s_strategy = "searchsorted"
+            elif d_first_index is not None or n_targets_so_far * max(n, 2).bit_length() >= 6 * n:   # (building the dictionary costs a few binary searches' worth per element)
+                s_strategy = "hash"
+            else:
+                s_strategy = "bisect"
+
+        if s_strategy == "hash":
+            if d_first_index is None:
+                # zipping in reverse means that for equal elements the first index is the one that ends up in the dictionary
+                d_first_index = dict(zip(reversed(list(l) if b_is_word_index else l), range(n-1, -1, -1)))
+            yield from map(d_first_index.get, l_batch)
+
+        elif s_strategy == "searchsorted":
+            if a_l is None:
+                a_l = np.asarray(list(l) if b_is_word_index else l)
+            a_batch = np.asarray(l_batch)
+            a_i = np.searchsorted(a_l, a_batch)
+            a_found = a_i < n
+            a_found[a_found] = a_l[a_i[a_found]] == a_batch[a_found]
+            yield from [int(i) if b_found else None for i, b_found in zip(a_i, a_found)]
+
+        elif b_is_word_index:  # "bisect" and "merge" both come down to WordIndex.find()
+            yield from map(l.find, l_batch)
+
+        elif s_strategy == "merge":
+            l_results = [None] * len(l_batch)
+            i_lb = 0
+            for j in sorted(range(len(l_batch)), key=l_batch.__getitem__):
+                target_value = l_batch[j]
+                i_lb = bisect_left(l, target_value, i_lb)
+                if i_lb < n and l[i_lb] == target_value:
+                    l_results[j] = i_lb
+            yield from l_results
+
+        else:
+            for target_value in l_batch:
+                i = bisect_left(l, target_value)
+                yield i if i < n and l[i] == target_value else None
+
+def bisect_many(l, targets, strategy="auto", n_batch_size=N_DEFAULT_LOOKUP_BATCH_SIZE, assume_sorted=False):
+    """
+    This function returns the list of iter_bisect_many() results (use iter_bisect_many() directly to stream results for inputs larger than memory).
+    """
+
+    return list(iter_bisect_many(l, targets, strategy=strategy, n_batch_size=n_batch_size, assume_sorted=assume_sorted))
+
+def benchmark_bisect_many(l, l_targets, l_strategies=S_BISECT_MANY_STRATEGIES, n_loop_max=1000):
+    """
+    This function benchmarks bisect_many() (for each strategy) against calling bisect() in a loop, on the same sorted list and targets.
+
+    Since bisect() re-checks sortedness on every call, the loop is only timed on (at most) n_loop_max targets and extrapolated to the whole batch.
+
+    returns:
+        a dictionary keyed by strategy (plus "bisect() loop"), containing the time (in seconds) to look up all of l_targets
+    """
+
+    print(f"Benchmarking lookups of {len(l_targets)} targets in a list of {len(l)} elements...")
+
+    l_sorted = sorted(l)
+    d_seconds = {}
+
+    l_loop_targets = l_targets[:n_loop_max]
+    t0 = time.perf_counter()
+    l_expected = [bisect(l_sorted, 0, len(l_sorted)-1, target_value) for target_value in l_loop_targets]
+    d_seconds["bisect() loop"] = (time.perf_counter() - t0) * len(l_targets) / max(len(l_loop_targets), 1)
+
+    for s_strategy in l_strategies:
+        t0 = time.perf_counter()
+        l_results = bisect_many(l_sorted, l_targets, strategy=s_strategy, assume_sorted=True)
+        d_seconds[s_strategy] = time.perf_counter() - t0
+
+        # bisect() may land on any one of equal elements, so compare found/not found (and the value found)
+        for target_value, i_expected, i_result in zip(l_loop_targets, l_expected, l_results):
+            if (i_expected is None) != (i_result is None) or (i_result is not None and l_sorted[i_result] != target_value):
+                print(f"\t***WARNING***: strategy '{s_strategy}' disagrees with bisect() for target -->{target_value}<--")
+                break
+
+    t_baseline = d_seconds["bisect() loop"]
+    for s_strategy, t_delta in d_seconds.items():
+        print(f"\t{s_strategy}:\t{t_delta:0.6f} seconds\t({t_baseline / max(t_delta, EPSILON):0.1f}x vs bisect() loop)")
+
+    return d_seconds
+
+def build_word_index(l_words, fname_index):
+    """
+    This function sorts a vocabulary ONCE and saves it as an on-disk word index that WordIndex can memory-map.
+
+    The file layout is:
+        1. header:  B_WORD_INDEX_MAGIC and the number n of (unique) words (S_WORD_INDEX_HEADER_FORMAT)
+        2. offsets: n+1 little-endian uint64 byte offsets into the blob (word i is blob[offsets[i]:offsets[i+1]])
+        3. blob:    all the words, UTF-8 encoded, concatenated in sorted order
+
+    Note that sorting str by code point (what sorted() does) gives the same order as sorting their UTF-8 bytes, so the index can be searched on raw bytes.
+
+    returns:
+        the number of words in the index
+    """
+
+    l_vocab = sorted(set(l_words))
+    l_b_words = [w.encode("utf-8") for w in l_vocab]
+
+    a_offsets = array("Q", [0])
+    n_offset = 0
+    for b_w in l_b_words:
+        n_offset += len(b_w)
+        a_offsets.append(n_offset)
+    if sys.byteorder != "little":
+        a_offsets.byteswap()
+
+    with open(fname_index, 'wb') as f_index:
+        f_index.write(struct.pack(S_WORD_INDEX_HEADER_FORMAT, B_WORD_INDEX_MAGIC, len(l_b_words)))
+        f_index.write(a_offsets.tobytes())
+        f_index.write(b"".join(l_b_words))
+
+    return len(l_b_words)
+
+class WordIndex:
+    """
+    This is a read-only, memory-mapped view of a word index written by build_word_index().
+
+    Opening an index only maps the file (nothing is parsed, sorted or loaded), so it is near-instant whatever the size of the vocabulary,
+        and lookups are iterative binary searches over the mapped bytes: O(log n), with no re-sort per query.
+
+    Usage:
+        with WordIndex("words.idx") as word_index:
+            i = word_index.find("whale")    # index of "whale" in the sorted vocabulary, or None
+    """
+
+    def __init__(self, fname_index):
+        self.fname_index = fname_index
+        self.f_index = open(fname_index, 'rb')
+        self.mm_index = mmap.mmap(self.f_index.fileno(), 0, access=mmap.ACCESS_READ)
+
+        n_header_size = struct.calcsize(S_WORD_INDEX_HEADER_FORMAT)
+        b_magic, self.n_words = struct.unpack_from(S_WORD_INDEX_HEADER_FORMAT, self.mm_index, 0)
+        if b_magic != B_WORD_INDEX_MAGIC:
+            self.close()
+            raise ValueError(f"{fname_index} is not a word index file")
+
+        n_offsets_size = 8 * (self.n_words + 1)
+        if sys.byteorder == "little":
+            self.offsets = memoryview(self.mm_index)[n_header_size:n_header_size + n_offsets_size].cast("Q")
+        else:
+            self.offsets = array("Q", self.mm_index[n_header_size:n_header_size + n_offsets_size])
+            self.offsets.byteswap()
+        self.i_blob_start = n_header_size + n_offsets_size
+
+    def __len__(self):
+        return self.n_words
+
+    def word_bytes(self, i):
+        return self.mm_index[self.i_blob_start + self.offsets[i]:self.i_blob_start + self.offsets[i+1]]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.n_words
+        if not 0 <= i < self.n_words:
+            raise IndexError("word index out of range")
+        return self.word_bytes(i).decode("utf-8")
+
+    def __iter__(self):
+        for i in range(self.n_words):
+            yield self[i]
+
+    def __contains__(self, word):
+        return self.find(word) is not None
+
+    def find(self, word):
+        """
+        This method returns the index of word in the (sorted) vocabulary, or None if it is not there.
+        """
+
+        b_word = word.encode("utf-8")
+
+        i_lb = 0
+        i_ub = self.n_words - 1
+        while i_lb <= i_ub:
+            i_midpoint = (i_lb + i_ub) // 2
+            b_midpoint = self.word_bytes(i_midpoint)
+            if b_midpoint == b_word:
+                return i_midpoint
+            if b_word < b_midpoint:
+                i_ub = i_midpoint - 1
+            else:
+                i_lb = i_midpoint + 1
+
+        return None
+
+    def close(self):
+        if isinstance(getattr(self, "offsets", None), memoryview):
+            self.offsets.release()  # the mmap cannot be closed while a view of it is still exported
+        self.mm_index.close()
+        self.f_index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def test_word_index(l_words):
+    """
+    This test writes the vocabulary of l_words to a word index (in a temporary directory) and checks, through WordIndex, that it round-trips:
+        every word is found at its index in sorted(set(l_words)), indexing gives the words back, and words that are not in it are not found.
+    """
+
+    l_vocab = sorted(set(l_words))
+
+    with tempfile.TemporaryDirectory() as s_tmp_dir:
+        fname_index = os.path.join(s_tmp_dir, "test.idx")
+        n_words = build_word_index(l_words, fname_index)
+        with WordIndex(fname_index) as word_index:
+            b_found = all(word_index.find(w) == i for i, w in enumerate(l_vocab)) and list(word_index) == l_vocab
+            b_not_found = all(word_index.find(w) is None for w in ["", "***not a word***", "\uffff"] if w not in l_vocab)
+
+    b_result = n_words == len(l_vocab) and b_found and b_not_found
+    print(f"\tTEST WordIndex(build_word_index(l={'<' + str(len(l_words)) + ' words>' if l_words else '[]'})) round trip: {b_result}")
+
+def build_corpus_store(fname, s_store_dir, n_chunk_size=N_DEFAULT_CHUNK_SIZE):
+    """
+    This function tokenizes a text file ONCE (into the same tokens as words_file_to_list(), but streaming) and saves it as a columnar corpus store that CorpusStore can memory-map.
+
+    The store is a directory of:
+        vocab.idx:  the sorted vocabulary (unique raw tokens) as a word index (see build_word_index())
+        ids.i32:    the token stream, as one little-endian int32 per token: the index of the token in the vocabulary
+        meta.json:  the format, the source file name, and the number of tokens and of vocabulary entries
+
+    Tokens are given ids in order of first appearance as the file is read (so there is a single pass over the text),
+        and the id array is then remapped in place to vocabulary (sorted) order, a block at a time.
+
+    returns:
+        the number of tokens in the store
+    """
+
+    os.makedirs(s_store_dir, exist_ok=True)
+    fname_ids = os.path.join(s_store_dir, "ids.i32")
+
+    d_first_seen_ids = {}
+    n_tokens = 0
+    with open(fname_ids, 'wb') as f_ids:
+        for s_chunk in iter_file_text_chunks(fname, n_chunk_size):
+            # (the arguments are evaluated before the call, so a new token gets the next id)
+            a_ids = array("i", [d_first_seen_ids.setdefault(tkn, len(d_first_seen_ids)) for tkn in s_chunk.split()])
+            if sys.byteorder != "little":
+                a_ids.byteswap()
+            a_ids.tofile(f_ids)
+            n_tokens += len(a_ids)
+
+    l_vocab = list(d_first_seen_ids)
+    n_vocab = build_word_index(l_vocab, os.path.join(s_store_dir, "vocab.idx"))
+
+    if n_tokens > 0:
+        a_sorted_ids = np.empty(n_vocab, dtype=np.int32)
+        a_sorted_ids[sorted(range(n_vocab), key=l_vocab.__getitem__)] = np.arange(n_vocab, dtype=np.int32)
+        a_ids = np.memmap(fname_ids, dtype="<i4", mode="r+")
+        for i in range(0, n_tokens, N_CORPUS_STORE_BLOCK_SIZE):
+            a_ids[i:i + N_CORPUS_STORE_BLOCK_SIZE] = a_sorted_ids[a_ids[i:i + N_CORPUS_STORE_BLOCK_SIZE]]
+        a_ids.flush()
+        del a_ids
+
+    with open(os.path.join(s_store_dir, "meta.json"), 'w') as f_meta:
+        json.dump({"format": S_CORPUS_STORE_FORMAT, "source": fname, "n_tokens": n_tokens, "n_vocab": n_vocab}, f_meta)
+    print(f"{s_store_dir} corpus store written ({n_tokens} tokens, {n_vocab} unique)")
+
+    return n_tokens
+
+class CorpusStore:
+    """
+    This is a read-only view of a corpus store written by build_corpus_store(): the vocabulary is a WordIndex and the token ids a numpy memmap.
+
+    Analyses never look at the text again: token frequencies are a (blockwise) numpy.bincount() over the ids, and everything else is derived from those frequencies
+        with one pass over the VOCABULARY (not the tokens), so re-running them costs little more than reading the id array (from the page cache, once it is warm).
+
+    Lookups (find()) refer to the sorted list of all the tokens, i.e. sorted(words_file_to_list(source)), as bisect() and bisect_many() do.
+
+    Usage:
+        with CorpusStore("mobysmall.store") as corpus_store:
+            s_summary, d_w_index, d_c_index = corpus_store.summarize()
+    """
+
+    def __init__(self, s_store_dir):
+        self.s_store_dir = s_store_dir
+        with open(os.path.join(s_store_dir, "meta.json"), 'r') as f_meta:
+            d_meta = json.load(f_meta)
+        if d_meta.get("format") != S_CORPUS_STORE_FORMAT:
+            raise ValueError(f"{s_store_dir} is not a corpus store")
+        self.source = d_meta["source"]
+        self.n_tokens = d_meta["n_tokens"]
+
+        self.vocab = WordIndex(os.path.join(s_store_dir, "vocab.idx"))
+        self.a_ids = np.memmap(os.path.join(s_store_dir, "ids.i32"), dtype="<i4", mode="r") if self.n_tokens > 0 else np.zeros(0, dtype="<i4")
+
+        self.a_token_counts = None
+        self.a_first_indices = None
+        self.t_inverted_index = None
+
+    def __len__(self):
+        return self.n_tokens
+
+    def token_counts(self):
+        """
+        returns:
+            the number of occurrences of each vocabulary entry (int64 numpy array, indexed by token id)
+        """
+
+        if self.a_token_counts is None:
+            a_token_counts = np.zeros(len(self.vocab), dtype=np.int64)
+            for i in range(0, self.n_tokens, N_CORPUS_STORE_BLOCK_SIZE):
+                a_token_counts += np.bincount(self.a_ids[i:i + N_CORPUS_STORE_BLOCK_SIZE], minlength=len(self.vocab))
+            self.a_token_counts = a_token_counts
+
+        return self.a_token_counts
+
+    def count(self, tkn):
+        i = self.vocab.find(tkn)
+        return 0 if i is None else int(self.token_counts()[i])
+
+    def find(self, tkn):
+        """
+        This method returns the index of the first occurrence of tkn in the sorted list of all the tokens, or None if tkn does not occur.
+        """
+
+        i = self.vocab.find(tkn)
+        if i is None:
+            return None
+
+        if self.a_first_indices is None:
+            self.a_first_indices = np.concatenate(([0], np.cumsum(self.token_counts())[:-1]))
+        return int(self.a_first_indices[i])
+
+    def inverted_index(self):
+        """
+        returns:
+            d_w_index, d_c_index: the same counts as tokens_list_to_inverted_index(words_file_to_list(source))
+        """
+
+        if self.t_inverted_index is None:
+            d_w_index = {}
+            d_c_index = {}
+            for tkn, n in zip(self.vocab, self.token_counts().tolist()):
+                w = process_token_to_word(tkn)
+                if w is not None:
+                    w_lower = w.lower()
+                    d_w_index[w_lower] = d_w_index.get(w_lower, 0) + n
+
+                    for c in w:
+                        d_c_index[c] = d_c_index.get(c, 0) + n
+            self.t_inverted_index = (d_w_index, d_c_index)
+
+        return self.t_inverted_index
+
+    def summarize(self):
+        """
+        returns:
+            the same 3 things as summarize_text_file(source)
+        """
+
+        d_w_index, d_c_index = self.inverted_index()
+        return format_text_file_summary(self.source, d_w_index, d_c_index)
+
+    def close(self):
+        self.vocab.close()
+        self.a_ids = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def test_corpus_store(fname, n_targets=100):
+    """
+    This test builds a corpus store of fname (in a temporary directory) and checks that it answers exactly like the text path:
+        CorpusStore.summarize() like summarize_text_file(fname), and CorpusStore.find() (and bisect_many() on the store) like bisect_many() on sorted(words_file_to_list(fname)),
+        for every n_targets-th distinct token and a token that does not occur.
+    """
+
+    l_tokens = words_file_to_list(fname)
+    l_sorted = sorted(l_tokens)
+    l_vocab = sorted(set(l_tokens))
+    l_targets = l_vocab[::max(1, len(l_vocab) // n_targets)] + ["***not a token***"]
+    l_expected = bisect_many(l_sorted, l_targets, assume_sorted=True)
+
+    with tempfile.TemporaryDirectory() as s_tmp_dir:
+        s_store_dir = os.path.join(s_tmp_dir, "test.store")
+        n_tokens = build_corpus_store(fname, s_store_dir)
+        with CorpusStore(s_store_dir) as corpus_store:
+            b_summary = corpus_store.summarize() == summarize_text_file(fname)
+            b_find = [corpus_store.find(tkn) for tkn in l_targets] == l_expected and bisect_many(corpus_store, l_targets) == l_expected
+
+    b_result = n_tokens == len(l_tokens) and b_summary and b_find
+    print(f"\tTEST CorpusStore(fname={fname}) summarize() == summarize_text_file() and find() of {len(l_targets)} tokens == bisect_many(): {b_result}")
+
+def process_token_to_word(tkn):
+    """
+    This function's sole purpose is to "clean" a token and return a word (or None if the token is not actually a word).
+
+    For instance, we want to strip preceding and trailing whitespace if any exists.
+
+    We also want to remove punctuation characters.
+    """
+
+    if tkn is None:
+        return None
+
+    tkn = tkn.strip()
+        
+    # strip punctuation
+    tkn = re.sub(r"[^\w\s]", "", tkn)
+    
+    if len(tkn) == 0:
+        return None
+
+    return tkn
+
+class NonWordCharDeleteMap(dict):
+    """
+    This is a str.translate() table that deletes exactly the chars process_token_to_word() strips (anything matched by [^\w\s]), for ANY (Unicode) char.
+
+    Entries are computed on first use (via __missing__) and then cached.
+    """
+
+    def __missing__(self, i_c):
+        value = None if RE_NON_WORD_CHARS.match(chr(i_c)) else i_c
+        self[i_c] = value
+        return value
+
+D_NON_WORD_CHAR_DELETE_MAP = NonWordCharDeleteMap()
+
+def tokenize_text__legacy(s):
+    """
+    Tokenizer engine: str.split() the text, then clean every token with process_token_to_word() (one regex substitution per token).
+    """
+
+    return [w for w in map(process_token_to_word, s.split()) if w is not None]
+
+def tokenize_text__regex(s):
+    """
+    Tokenizer engine: delete the punctuation of the whole text with ONE precompiled regex substitution, then str.split() it.
+    """
+
+    return RE_NON_WORD_CHARS.sub("", s).split()
+
+def tokenize_text__translate(s):
+    """
+    Tokenizer engine: delete the punctuation of the whole text with a translation table (see clean_text()), then str.split() it.
+    """
+
+    return clean_text(s).split()
+
+def clean_text(s):
+    """
+    This function deletes the punctuation (every char process_token_to_word() strips) from a whole text buffer, leaving the words and the whitespace between them.
+        Pure-ASCII text is deleted from as bytes (B_ASCII_NON_WORD_CHARS), anything else through the (cached) Unicode D_NON_WORD_CHAR_DELETE_MAP.
+    """
+
+    if s.isascii():
+        return s.encode("ascii").translate(None, B_ASCII_NON_WORD_CHARS).decode("ascii")
+    return s.translate(D_NON_WORD_CHAR_DELETE_MAP)
+
+# the registered tokenizer engines: each takes a text buffer and returns its list of words
+#   every engine must return exactly what tokenize_text__legacy() returns (see benchmark_tokenizers())
+D_TOKENIZER_ENGINES = {
+    "legacy": tokenize_text__legacy,
+    "regex": tokenize_text__regex,
+    "translate": tokenize_text__translate
+}
+
+def register_tokenizer(s_engine, fn_tokenize):
+    """
+    This function registers (or replaces) a tokenizer engine, which can then be selected by name wherever an engine is accepted.
+    """
+
+    D_TOKENIZER_ENGINES[s_engine] = fn_tokenize
+
+def tokenize_text(s, engine=S_DEFAULT_TOKENIZER):
+    """
+    This function returns the words of a text buffer: the same words, in the same order, as cleaning each whitespace-delimited token with process_token_to_word()
+        (and dropping the tokens that are not words), but in one pass over the whole buffer.
+
+    engine is the name of a registered engine (see D_TOKENIZER_ENGINES) or a tokenizer function.
+    """
+
+    fn_tokenize = engine if callable(engine) else D_TOKENIZER_ENGINES[engine]
+
+    return fn_tokenize(s)
+
+def iter_file_words(fname, n_chunk_size=N_DEFAULT_CHUNK_SIZE, engine=S_DEFAULT_TOKENIZER):
+    """
+    This generator yields the (clean) words of a text file: it is words_file_to_list() followed by process_token_to_word() (streamed, see iter_file_text_chunks()), but tokenizing a whole chunk at a time (see tokenize_text()).
+    """
+
+    for s_chunk in iter_file_text_chunks(fname, n_chunk_size):
+        if METRICS is not None:
+            METRICS.count("tokens", len(s_chunk.split()))   # (the words alone would undercount the tokens: see count_text_chunk())
+        yield from tokenize_text(s_chunk, engine)
+
+def benchmark_tokenizers(fname, l_engines=None, n_warmup=N_BENCHMARK_WARMUP, n_samples=N_BENCHMARK_SAMPLES):
+    """
+    This function benchmarks the tokenizer engines against the current per-token approach (process_token_to_word() on every token of words_file_to_list()),
+        on the whole text of fname, and checks that each engine returns exactly the same words.
+
+    returns:
+        a dictionary keyed by engine (plus "process_token_to_word"), containing the statistics returned by benchmark()
+    """
+
+    with open(fname, 'r') as f_words:
+        s_text = f_words.read()
+    l_tokens = s_text.split()
+    l_expected = [w for w in (process_token_to_word(tkn) for tkn in l_tokens) if w is not None]
+
+    print(f"Benchmarking tokenizers on '{fname}' ({len(l_tokens)} tokens)...")
+
+    d_results = {"process_token_to_word": benchmark(lambda: [process_token_to_word(tkn) for tkn in l_tokens], n_warmup, n_samples)}
+    for s_engine in (l_engines if l_engines is not None else list(D_TOKENIZER_ENGINES.keys())):
+        if tokenize_text(s_text, s_engine) != l_expected:
+            print(f"\t***WARNING***: engine '{s_engine}' does not return the same words as process_token_to_word()")
+        d_results[s_engine] = benchmark(lambda: tokenize_text(s_text, s_engine), n_warmup, n_samples)
+
+    t_baseline = d_results["process_token_to_word"]["median"]
+    for s_engine, d_stats in d_results.items():
+        print(f"\t{s_engine}:\tmedian={d_stats['median']*1e3:0.3f} ms\t({t_baseline / max(d_stats['median'], EPSILON):0.1f}x vs process_token_to_word)")
+
+    return d_results
+
+
+def tokens_list_to_inverted_index(l_tokens, fn_process_token_to_word=process_token_to_word, debug=False):
+    """
+    This function converts a list of tokens into two dictionaries:
+        1. the first dictionary is keyed by each unqiue word and the corresponding value is the count of that word
+        2. the second dictionary is keyed by each unqiue character and the corresponding value is the count of that character
+
+    The above happens AFTER the token is cleaned by the function specified by the fn_process_token_to_word argument
+        (fn_process_token_to_word=None means the tokens are already clean words, e.g. the output of tokenize_text())
+    """
+
+    if METRICS is not None:
+        return tokens_list_to_inverted_index__instrumented(l_tokens, fn_process_token_to_word)
+
+    d_w_index = {}
+    d_c_index = {}
+    
+    for w in (l_tokens if fn_process_token_to_word is None else map(fn_process_token_to_word, l_tokens)):
+        if w is not None:
+            w_lower = w.lower()
+            d_w_index[w_lower] = d_w_index.get(w_lower, 0) + 1
+            
+            for c in w:
+                d_c_index[c] = d_c_index.get(c, 0) + 1
+
+    return d_w_index, d_c_index
+
+
+def tokens_list_to_inverted_index__instrumented(l_tokens, fn_process_token_to_word=process_token_to_word):
+    """
+    This is tokens_list_to_inverted_index() when instrumentation is on: the same counting, but done N_INSTRUMENTED_BATCH_SIZE tokens at a time so that
+        the "read" (pulling tokens, which is where the file is read when l_tokens is a generator), "tokenize" (cleaning) and "index" (counting) stages can be timed separately,
+        at the cost of a few timer calls per batch rather than per token.
+
+    (When the tokens are already clean words coming from a generator, e.g. iter_file_words(), their tokenization happens while they are pulled, so it is part of "read",
+        and the raw tokens are not seen here: they are counted by the generator, e.g. iter_file_words(), if at all.)
+    """
+
+    d_w_index = {}
+    d_c_index = {}
+
+    it_tokens = iter(l_tokens)
+    while True:
+        with METRICS.stage("read"):
+            l_batch = list(islice(it_tokens, N_INSTRUMENTED_BATCH_SIZE))
+        if not l_batch:
+            break
+
+        with METRICS.stage("tokenize"):
+            l_batch_words = l_batch if fn_process_token_to_word is None else [fn_process_token_to_word(tkn) for tkn in l_batch]
+
+        with METRICS.stage("index"):
+            for w in l_batch_words:
+                if w is not None:
+                    w_lower = w.lower()
+                    d_w_index[w_lower] = d_w_index.get(w_lower, 0) + 1
+
+                    for c in w:
+                        d_c_index[c] = d_c_index.get(c, 0) + 1
+
+        if fn_process_token_to_word is not None:
+            METRICS.count("tokens", len(l_batch))
+        METRICS.count("words", len(l_batch_words) - l_batch_words.count(None))
+
+    METRICS.set_gauge("unique_words", len(d_w_index))
+    METRICS.set_gauge("unique_chars", len(d_c_index))
+
+    return d_w_index, d_c_index
+
+
+class CharCounts:
+    """
+    This is a compact character frequency counter: the counts of the first N_CHAR_COUNTS_DENSE_SIZE code points (ASCII and Latin-1) live in a fixed-size int64 array,
+        filled by a bulk numpy.bincount() over the encoded text, and any other code point goes into a small sparse dictionary.
+
+    add_text() counts every NON-whitespace char of a text buffer, so adding a buffer of words (e.g. the output of clean_text()) counts exactly the chars of those words.
+
+    The upper-case/lower-case totals come from array masks (A_CHAR_IS_UPPER/A_CHAR_IS_LOWER), and to_dict() converts the counts (losslessly) to the d_c_index dictionary
+        that tokens_list_to_inverted_index() produces.
+    """
+
+    __slots__ = ("a_counts", "d_overflow")
+
+    def __init__(self):
+        self.a_counts = np.zeros(N_CHAR_COUNTS_DENSE_SIZE, dtype=np.int64)
+        self.d_overflow = {}
+
+    def add_text(self, s):
+        if not s:
+            return
+
+        try:
+            a_code_points = np.frombuffer(s.encode("latin-1"), dtype=np.uint8)
+        except UnicodeEncodeError:
+            # (some) code points beyond the dense range: count those sparsely
+            a_code_points = np.frombuffer(s.encode("utf-32-le"), dtype=np.uint32)
+            a_is_sparse = a_code_points >= N_CHAR_COUNTS_DENSE_SIZE
+            a_sparse_code_points, a_sparse_counts = np.unique(a_code_points[a_is_sparse], return_counts=True)
+            for i_c, n_c in zip(a_sparse_code_points.tolist(), a_sparse_counts.tolist()):
+                c = chr(i_c)
+                if not c.isspace():
+                    self.d_overflow[c] = self.d_overflow.get(c, 0) + n_c
+            a_code_points = a_code_points[~a_is_sparse]
+
+        self.a_counts += np.bincount(a_code_points, minlength=N_CHAR_COUNTS_DENSE_SIZE)
+
+    def merge(self, char_counts):
+        self.a_counts += char_counts.a_counts
+        for c, n_c in char_counts.d_overflow.items():
+            self.d_overflow[c] = self.d_overflow.get(c, 0) + n_c
+
+    def n_upper(self):
+        return int(self.a_counts[A_CHAR_IS_UPPER].sum()) + sum([n_c for c, n_c in self.d_overflow.items() if c.isalpha() and c.isupper()])
+
+    def n_lower(self):
+        return int(self.a_counts[A_CHAR_IS_LOWER].sum()) + sum([n_c for c, n_c in self.d_overflow.items() if c.isalpha() and not c.isupper()])
+
+    def to_dict(self):
+        # (whitespace is counted by the bincount, but is never part of a word)
+        a_i_nonzero = np.flatnonzero((self.a_counts > 0) & ~A_CHAR_IS_SPACE)
+        d_c_index = {chr(i_c): n_c for i_c, n_c in zip(a_i_nonzero.tolist(), self.a_counts[a_i_nonzero].tolist())}
+        d_c_index.update(self.d_overflow)
+        return {c: d_c_index[c] for c in sorted(d_c_index.keys())}
+
+class SpaceSaving:
+    """
+    This is the Space-Saving heavy-hitters summary: it counts the words of a stream of any size within a fixed memory budget (n_max_bytes),
+        and the words that occur more often than the counts it drops (n_max_unmonitored_count) are guaranteed to be among the words it keeps.
+
+    The memory of each monitored word is accounted for as it is actually stored: the size of the word itself (sys.getsizeof()),
+        plus N_SPACE_SAVING_BYTES_PER_ENTRY for its 2 dictionary entries, heap entry and counts (measured, with headroom for dictionary resizing),
+        so a few long words (URLs, IDs, ...) take the room of many short ones, and the summary stays within (about) n_max_bytes.
+        The bound is approximate: the overhead is a constant measured on one CPython build (64-bit 3.11), not the actual size of the dictionaries and the heap,
+        which grow in steps and lay out differently on other builds.
+
+    When a word that is not monitored does not fit, the counters with the smallest counts are evicted (the evicted words are forgotten) until it does,
+        and the largest evicted count c becomes the floor: every new word then starts from c + its own count, and c is remembered as its maximum over-estimation (error).
+        So for every monitored word: count - error <= true count <= count, and any word that is not monitored occurs at most n_max_unmonitored_count (the floor) times.
+
+    The smallest counter is found with a heap holding exactly one (count, word) entry per monitored word.
+        Counts only ever grow, so stale entries are lazily refreshed when they reach the top, instead of on every update.
+    """
+
+    __slots__ = ("n_max_bytes", "n_bytes", "d_counts", "d_errors", "l_heap", "n_total", "n_max_unmonitored_count")
+
+    def __init__(self, n_max_bytes):
+        self.n_max_bytes = n_max_bytes
+        self.n_bytes = 0
+        self.d_counts = {}
+        self.d_errors = {}
+        self.l_heap = []
+        self.n_total = 0
+        self.n_max_unmonitored_count = 0
+
+    @classmethod
+    def from_memory_budget(cls, n_bytes=N_DEFAULT_WORD_MEMORY_BYTES, n_chunk_size=N_DEFAULT_CHUNK_SIZE):
+        """
+        This method makes a summary that fits (approximately, see above) in n_bytes together with the reading of the file (N_SPACE_SAVING_READER_BYTES are set aside for the reader's buffers)
+            and the chunk being counted (its text, its words and their chunk-local Counter, see count_text_chunk()): N_SPACE_SAVING_BYTES_PER_CHUNK_CHAR bytes per char of n_chunk_size.
+        """
+
+        return cls(max(0, n_bytes - N_SPACE_SAVING_READER_BYTES - n_chunk_size * N_SPACE_SAVING_BYTES_PER_CHUNK_CHAR))
+
+    def update(self, word, n=1):
+        self.n_total += n
+        d_counts = self.d_counts
+
+        if word in d_counts:
+            d_counts[word] += n
+            return
+
+        n_word_bytes = sys.getsizeof(word) + N_SPACE_SAVING_BYTES_PER_ENTRY
+        if n_word_bytes > self.n_max_bytes:
+            # (a word larger than the whole budget is never monitored: its count goes to the floor, which stays an upper bound of every unmonitored count)
+            self.n_max_unmonitored_count += n
+            return
+
+        l_heap = self.l_heap
+        while self.n_bytes + n_word_bytes > self.n_max_bytes:
+            while d_counts[l_heap[0][1]] != l_heap[0][0]:
+                heapq.heapreplace(l_heap, (d_counts[l_heap[0][1]], l_heap[0][1]))
+            n_min, word_min = heapq.heappop(l_heap)
+            del d_counts[word_min]
+            del self.d_errors[word_min]
+            self.n_bytes -= sys.getsizeof(word_min) + N_SPACE_SAVING_BYTES_PER_ENTRY
+            self.n_max_unmonitored_count = max(self.n_max_unmonitored_count, n_min)
+
+        n_floor = self.n_max_unmonitored_count
+        d_counts[word] = n_floor + n
+        self.d_errors[word] = n_floor
+        heapq.heappush(l_heap, (n_floor + n, word))
+        self.n_bytes += n_word_bytes
+
+    def update_counts(self, d_counts):
+        """
+        This method adds pre-aggregated counts (e.g. the collections.Counter of a chunk of words), which is much faster than calling update() once per word.
+        """
+
+        for word, n in d_counts.items():
+            self.update(word, n)
+
+    def top_k(self, k=N_DEFAULT_TOP_K):
+        """
+        returns:
+            the (up to) k words with the highest counts, as a list of (word, count, error) tuples, by decreasing count (the true count is in [count - error, count])
+        """
+
+        return [(word, n, self.d_errors[word]) for word, n in heapq.nlargest(k, self.d_counts.items(), key=itemgetter(1))]
+
+def top_k_words(word_counts, k=N_DEFAULT_TOP_K):
+    """
+    This function returns the k most frequent words, as a list of (word, count, error) tuples by decreasing count.
+
+    arguments:
+        word_counts:    either an exact word count dictionary (d_w_index), in which case the counts are exact (error is always 0),
+                            or a SpaceSaving summary (see summarize_text_file(..., n_word_memory_bytes=...)), in which case the true count of each word is in [count - error, count],
+                            or a CorpusStore (exact counts)
+        k
+
+    The exact top k is selected with a heap in O(n log k), rather than by sorting the whole dictionary.
+    """
+
+    if isinstance(word_counts, SpaceSaving):
+        return word_counts.top_k(k)
+    if isinstance(word_counts, CorpusStore):
+        word_counts = word_counts.inverted_index()[0]
+    return [(word, n, 0) for word, n in heapq.nlargest(k, word_counts.items(), key=itemgetter(1))]
+
+def test_space_saving(fname, n_bytes):
+    """
+    This test checks that summarize_text_file(fname, n_word_memory_bytes=n_bytes) stays within n_bytes (its traced peak memory),
+        that every monitored word's true count (from the exact summarize_text_file()) is within its [count - error, count] bounds,
+        and that every word occurring more than n_max_unmonitored_count times is monitored.
+    """
+
+    _, d_w_expected, _ = summarize_text_file(fname)
+
+    enable_instrumentation(b_trace_memory=True)
+    _, word_counts, _ = summarize_text_file(fname, n_word_memory_bytes=n_bytes)
+    n_peak_bytes = disable_instrumentation().d_gauges["peak_memory_bytes"]
+
+    b_bounds = all(n - word_counts.d_errors[word] <= d_w_expected.get(word, 0) <= n for word, n in word_counts.d_counts.items())
+    b_heavy_hitters = all(word in word_counts.d_counts for word, n in d_w_expected.items() if n > word_counts.n_max_unmonitored_count)
+    b_result = n_peak_bytes <= n_bytes and word_counts.n_total == sum(d_w_expected.values()) and b_bounds and b_heavy_hitters
+    print(f"\tTEST SpaceSaving(n_word_memory_bytes={n_bytes}) (peak {n_peak_bytes} bytes, {len(word_counts.d_counts)} of {len(d_w_expected)} words monitored) within budget and bounds: {b_result}")
+
+def count_text_chunk(s_chunk, word_counts, char_counts, tokenizer=S_DEFAULT_TOKENIZER):
+    """
+    This function counts the words and characters of one word-aligned text chunk, without any per-character dictionary traffic:
+        the chunk is tokenized once (tokenize_text()), the chars of its words are counted in bulk by char_counts (a CharCounts),
+        and its (lower-cased) words are added to word_counts (a collections.Counter, or a SpaceSaving, which gets a chunk-local Counter).
+
+    When instrumentation is on, tokenizing and counting are timed as the "tokenize" and "index" stages,
+        and the tokens (whitespace-delimited, before cleaning, as on the list path) and the words are counted.
+    """
+
+    with instrumented_stage("tokenize"):
+        l_words = tokenize_text(s_chunk, tokenizer)
+
+    with instrumented_stage("index"):
+        char_counts.add_text(" ".join(l_words))     # (CharCounts ignores whitespace, so only the chars of the words are counted)
+        if isinstance(word_counts, SpaceSaving):
+            word_counts.update_counts(Counter(map(str.lower, l_words)))
+        else:
+            word_counts.update(map(str.lower, l_words))
+
+    if METRICS is not None:
+        METRICS.count("tokens", len(s_chunk.split()))   # (split again only when instrumented: the tokenizer drops the tokens that are not words)
+        METRICS.count("words", len(l_words))
+
+def inverted_index_of_text_chunks__char_counts(it_text_chunks, word_counts=None, tokenizer=S_DEFAULT_TOKENIZER):
+    """
+    This function counts the words and characters of word-aligned text chunks (e.g. from iter_file_text_chunks()), one chunk at a time (see count_text_chunk()).
+
+    When word_counts (a SpaceSaving) is given, the words are added to it, instead of being counted exactly.
+
+    When instrumentation is on, pulling the chunks (which is where the file is read and decoded) is timed as the "read" stage,
+        on top of what count_text_chunk() records, and the number of unique words and chars are recorded as gauges.
+
+    returns:
+        d_w_index (or word_counts, when given), char_counts (a CharCounts)
+    """
+
+    counter_w = Counter() if word_counts is None else word_counts
+    char_counts = CharCounts()
+
+    it_text_chunks = iter(it_text_chunks)
+    while True:
+        with instrumented_stage("read"):
+            s_chunk = next(it_text_chunks, None)
+        if s_chunk is None:
+            break
+        count_text_chunk(s_chunk, counter_w, char_counts, tokenizer)
+
+    if METRICS is not None:
+        METRICS.set_gauge("unique_words", len(counter_w.d_counts if isinstance(counter_w, SpaceSaving) else counter_w))
+        METRICS.set_gauge("unique_chars", len(char_counts.to_dict()))
+
+    return (dict(counter_w) if word_counts is None else word_counts), char_counts
+
+
+def summarize_text_file(fname, streaming=True, n_chunk_size=N_DEFAULT_CHUNK_SIZE, tokenizer=S_DEFAULT_TOKENIZER, use_char_array=True, n_word_memory_bytes=None):
+    """
+    This function opens a text file and summarizes its word count and letter count.
+
+    Note that case matters!
+
+    arguments:
+        fname:          a text file name (or a CorpusStore, which is summarized from its token counts without re-reading the text: see CorpusStore.summarize())
+        streaming:      when True (the default), the file is read n_chunk_size chars at a time and counted as it is read, so peak memory stays bounded
+                            (by the chunk size and the size of the dictionaries) no matter how big the file is.
+                        when False, the whole file is first loaded into a list of words (via words_file_to_list())
+        n_chunk_size
+        tokenizer:      the tokenize_text() engine used when streaming (the list path always cleans token by token with process_token_to_word())
+        use_char_array: when streaming, count chars with the array-backed CharCounts (see count_text_chunk()) instead of per-char dictionary updates
+        n_word_memory_bytes:
+                        when given, words are counted approximately by a SpaceSaving summary rather than exactly, within about that many bytes
+                            (the summary's words and counters, plus the file reader and the chunk being counted: chunks are shrunk to at most 1/8 of the budget;
+                            the overheads are estimates measured on one CPython build, see SpaceSaving)
+                            (for vocabularies too large to count in memory); this implies streaming with use_char_array
+
+    returns:
+        1. the summary string, which is formatted, containing the summary statistics:
+            1. the frequency count that each (case-sensitive) letter occurs (out of the total number of letters), as well as the frequency ratio (as a percentage)
+            2. the frequency (count and ratio) of upper-case letters as a group
+            3. the frequency (count and ratio) of lower-case letters as a group
+
+        2. a dictionary keyed by words, containing the count of each unique word (or the SpaceSaving summary, with n_word_memory_bytes: see top_k_words())
+
+        3. a dictionary keyed by letter, containing the count of each unique letter
+
+    """
+
+    if isinstance(fname, CorpusStore):
+        return fname.summarize()
+    elif n_word_memory_bytes is not None:
+        # the chunks are shrunk, if need be, so that counting one takes at most 1/8 of the budget (the rest goes to the summary)
+        n_chunk_size = max(1, min(n_chunk_size, n_word_memory_bytes // (8 * N_SPACE_SAVING_BYTES_PER_CHUNK_CHAR)))
+        word_counts, char_counts = inverted_index_of_text_chunks__char_counts(iter_file_text_chunks(fname, n_chunk_size), word_counts=SpaceSaving.from_memory_budget(n_word_memory_bytes, n_chunk_size), tokenizer=tokenizer)
+        s_summary, _, d_c_index = format_text_file_summary(fname, {}, char_counts.to_dict(), t_case_totals=(char_counts.n_upper(), char_counts.n_lower()), n_words=word_counts.n_total)
+        return s_summary, word_counts, d_c_index
+    elif streaming and use_char_array:
+        d_w_index, char_counts = inverted_index_of_text_chunks__char_counts(iter_file_text_chunks(fname, n_chunk_size), tokenizer=tokenizer)
+        return format_text_file_summary(fname, d_w_index, char_counts.to_dict(), t_case_totals=(char_counts.n_upper(), char_counts.n_lower()))
+    elif streaming:
+        # words are produced lazily, a whole chunk at a time, and counted as they go (so no list of all the words is ever built)
+        d_w_index, d_c_index = tokens_list_to_inverted_index(iter_file_words(fname, n_chunk_size, engine=tokenizer), fn_process_token_to_word=None)
+    else:
+        l_words = words_file_to_list(fname, use_list_append=False)
+        d_w_index, d_c_index = tokens_list_to_inverted_index(l_words)
+
+    return format_text_file_summary(fname, d_w_index, d_c_index)
+
+def format_text_file_summary(fname, d_w_index, d_c_index, t_case_totals=None, n_words=None):
+    """
+    This function formats the word and character counts (as produced by tokens_list_to_inverted_index()) into the TEXT_FILE_SUMMARY_TEMPLATE summary string.
+
+    t_case_totals optionally gives the (upper-case, lower-case) letter totals when they are already known (e.g. from CharCounts), instead of adding them up here.
+    n_words likewise optionally gives the total word count (e.g. when the words were not counted exactly), instead of adding up d_w_index.
+
+    returns:
+        the same 3 things as summarize_text_file()
+    """
+
+    with instrumented_stage("format"):
+        return format_text_file_summary__impl(fname, d_w_index, d_c_index, t_case_totals, n_words)
+
+def format_text_file_summary__impl(fname, d_w_index, d_c_index, t_case_totals=None, n_words=None):
+    if n_words is None:
+        n_words = 0
+        for k in d_w_index.keys():
+            n_words += d_w_index[k]
+
+    # re-arrange d_c_index so that keys are in alphabetical order (based on sorted() order)
+    d_c_index = {k:d_c_index[k] for k in sorted(d_c_index.keys())}
+
+    # count all letters (so that we can provide frequency of each letter as a ratio or percentage)
+    n_c_all = sum([n_c for _, n_c in d_c_index.items()])
+    n_c_all_denom = n_c_all if n_c_all > 0 else 1   # an empty file simply reports 0%
+
+    # now create separate counts of upper and lower case letter (and create formatted individual letter freq summary)
+    s_letter_freq__all = ""
+    n_c_uc = 0
+    n_c_lc = 0
+    for c, n_c in d_c_index.items():
+        s_letter_freq__all += "\t\t\t" + LETTER_FREQ_TEMPLATE.format(c, n_c, n_c_all, (n_c/n_c_all_denom)*100) + "\n"
+
+        if t_case_totals is None and c.isalpha():
+            if c.isupper():
+                n_c_uc += n_c
+            else:
+                n_c_lc += n_c
+
+    if t_case_totals is not None:
+        n_c_uc, n_c_lc = t_case_totals
+
+    # now create summary strings of upper and lower case freqs
+    s_letter_freq__ucase = "\t" + LETTER_FREQ_TEMPLATE.format("UPPER-CASE", n_c_uc, n_c_all, (n_c_uc/n_c_all_denom)*100)
+    s_letter_freq__lcase = "\t" + LETTER_FREQ_TEMPLATE.format("LOWER-CASE", n_c_lc, n_c_all, (n_c_lc/n_c_all_denom)*100)
+
+    # return entire formatted summary string as well as the dictionaries (in case we want to use them later)
+    return TEXT_FILE_SUMMARY_TEMPLATE.format(
+        fname,
+        n_words,
+        s_letter_freq__all,
+        s_letter_freq__ucase,
+        s_letter_freq__lcase
+    ), d_w_index, d_c_index
+
+
+def text_file_byte_shards(fname, n_shard_size=N_DEFAULT_SHARD_SIZE):
+    """
+    This function cuts a text file into byte ranges of (roughly) n_shard_size bytes, each of which can be tokenized independently.
+
+    Every boundary is moved forward to just past the next whitespace byte, so a boundary never splits a word (nor a multi-byte char).
+        This is only safe for ASCII-compatible encodings, so any other encoding gets a single shard for the whole file.
+
+    returns:
+        a list of (fname, i_start, i_end) tuples covering the whole file, in order
+    """
+
+    n_bytes = os.path.getsize(fname)
+
+    if n_bytes <= n_shard_size or codecs.lookup(locale.getpreferredencoding(False)).name not in S_ASCII_COMPATIBLE_ENCODINGS:
+        return [(fname, 0, n_bytes)]
+
+    l_shards = []
+    with open(fname, 'rb') as f_words:
+        i_start = 0
+        while i_start < n_bytes:
+            i_end = i_start + n_shard_size
+            if i_end >= n_bytes:
+                i_end = n_bytes
+            else:
+                f_words.seek(i_end)
+                while True:
+                    b_block = f_words.read(N_DEFAULT_CHUNK_SIZE)
+                    if not b_block:     # no more whitespace: the last word runs to the end of the file
+                        i_end = n_bytes
+                        break
+                    m = RE_WHITESPACE_BYTE.search(b_block)
+                    if m is not None:
+                        i_end += m.end()
+                        break
+                    i_end += len(b_block)
+            l_shards.append((fname, i_start, i_end))
+            i_start = i_end
+
+    return l_shards
+
+def inverted_index_of_byte_range(t_shard):
+    """
+    This function is the "map" step of summarize_corpus(): it counts the words and characters in one shard (byte range) of a text file,
+        reading and decoding it N_DEFAULT_CHUNK_SIZE bytes at a time (so memory stays bounded by the chunk size, not the shard size).
+
+    arguments:
+        t_shard:    a tuple of (fname, i_start, i_end), as produced by text_file_byte_shards()
+
+    returns:
+        fname, d_w_index, d_c_index (see tokens_list_to_inverted_index())
+    """
+
+    fname, i_start, i_end = t_shard
+
+    def iter_decoded_chunks():
+        decoder = codecs.getincrementaldecoder(locale.getpreferredencoding(False))()
+        with open(fname, 'rb') as f_words:
+            f_words.seek(i_start)
+            n_bytes_left = i_end - i_start
+            while n_bytes_left > 0:
+                b_chunk = f_words.read(min(N_DEFAULT_CHUNK_SIZE, n_bytes_left))
+                if not b_chunk:
+                    break
+                n_bytes_left -= len(b_chunk)
+                yield decoder.decode(b_chunk)
+            yield decoder.decode(b"", final=True)
+
+    try:
+        d_w_index, d_c_index = tokens_list_to_inverted_index(
+            (w for s_chunk in iter_word_aligned_chunks(iter_decoded_chunks()) for w in tokenize_text(s_chunk)),
+            fn_process_token_to_word=None
+        )
+    except Exception as e:
+        print(f"inverted_index_of_byte_range: ***RUNTIME ERROR caught*** ({fname} [{i_start}:{i_end}]): {e}")
+        d_w_index, d_c_index = {}, {}
+
+    return fname, d_w_index, d_c_index
+
+def merge_inverted_indices(l_indices, d_w_index=None, d_c_index=None):
+    """
+    This function is the "reduce" step of summarize_corpus(): it adds up any number of (d_w_index, d_c_index) pairs.
+
+    If d_w_index/d_c_index are given, the counts are merged into them (in place).
+
+    returns:
+        d_w_index, d_c_index
+    """
+
+    d_w_index = {} if d_w_index is None else d_w_index
+    d_c_index = {} if d_c_index is None else d_c_index
+
+    for d_w_part, d_c_part in l_indices:
+        for w, n_w in d_w_part.items():
+            d_w_index[w] = d_w_index.get(w, 0) + n_w
+        for c, n_c in d_c_part.items():
+            d_c_index[c] = d_c_index.get(c, 0) + n_c
+
+    return d_w_index, d_c_index
+
+def summarize_corpus(corpus, workers=None, n_shard_size=N_DEFAULT_SHARD_SIZE, s_glob="*.txt"):
+    """
+    This function summarizes a whole corpus of text files, map-reduce style.
+
+    Files are cut into shards (byte ranges aligned to word boundaries, see text_file_byte_shards()), the shards are counted in a process pool
+        (see inverted_index_of_byte_range()) and the partial counts are merged per file and for the corpus as a whole.
+        The merged counts are exactly what summarize_text_file() would count file by file.
+
+    arguments:
+        corpus:         a directory (every file in it matching s_glob is summarized), a single file name or a list of file names
+        workers:        the number of worker processes (None means one per core, 1 means run in this process)
+        n_shard_size:   files larger than this many bytes are split across workers
+        s_glob
+
+    returns:
+        1. the summary string of the whole corpus (same format as summarize_text_file())
+        2. the word count dictionary of the whole corpus
+        3. the letter count dictionary of the whole corpus
+        4. a dictionary keyed by file name, containing the 3 things summarize_text_file() returns for that file
+    """
+
+    if isinstance(corpus, str):
+        l_fnames = sorted(glob.glob(os.path.join(corpus, s_glob))) if os.path.isdir(corpus) else [corpus]
+    else:
+        l_fnames = list(corpus)
+
+    l_shards = []
+    for fname in l_fnames:
+        l_shards += text_file_byte_shards(fname, n_shard_size)
+
+    # many small files means many small tasks, so ship them to the workers in batches
+    n_workers = workers if workers is not None else (os.cpu_count() or 1)
+    n_tasks_per_batch = max(1, len(l_shards) // (n_workers * 4))
+
+    d_file_indices = {fname: ({}, {}) for fname in l_fnames}
+    for fname, d_w_part, d_c_part in map_tasks(inverted_index_of_byte_range, l_shards, workers, n_tasks_per_batch):
+        merge_inverted_indices([(d_w_part, d_c_part)], *d_file_indices[fname])
+
+    d_file_summaries = {fname: format_text_file_summary(fname, d_w_index, d_c_index) for fname, (d_w_index, d_c_index) in d_file_indices.items()}
+    d_w_index, d_c_index = merge_inverted_indices(d_file_indices.values())
+
+    s_corpus_summary, d_w_index, d_c_index = format_text_file_summary(f"{corpus if isinstance(corpus, str) else '<corpus>'} ({len(l_fnames)} files)", d_w_index, d_c_index)
+
+    return s_corpus_summary, d_w_index, d_c_index, d_file_summaries
+
+def test_text_file_byte_shards(fname, n_shard_size):
+    """
+    This test checks that the shards of fname cover it without gaps or overlaps,
+        and that counting it shard by shard and merging the counts (what summarize_corpus() does) gives exactly the counts of summarize_text_file().
+    """
+
+    l_shards = text_file_byte_shards(fname, n_shard_size)
+    b_contiguous = l_shards[0][1] == 0 and l_shards[-1][2] == os.path.getsize(fname) and all(t_prev[2] == t[1] for t_prev, t in zip(l_shards, l_shards[1:]))
+    d_w_index, d_c_index = merge_inverted_indices([inverted_index_of_byte_range(t_shard)[1:] for t_shard in l_shards])
+    _, d_w_expected, d_c_expected = summarize_text_file(fname)
+
+    b_result = b_contiguous and d_w_index == d_w_expected and d_c_index == d_c_expected
+    print(f"\tTEST text_file_byte_shards(fname={fname}, n_shard_size={n_shard_size}) ({len(l_shards)} shards) counts == summarize_text_file() counts: {b_result}")
+
+
+def file_fingerprint(f, n_size, b_full_hash=False):
+    """
+    This function fingerprints the first n_size bytes of the (binary) file object f: a sha256 over n_size and the content.
+
+    By default only the first and the last N_CACHE_FINGERPRINT_BLOCK_SIZE bytes (of the n_size) are hashed, so fingerprinting a 10 GB file costs two small reads.
+        b_full_hash=True hashes all n_size bytes instead (slow on big files, but catches any in-place edit).
+    """
+
+    h = hashlib.sha256(str(n_size).encode("ascii"))
+
+    if b_full_hash or n_size <= 2 * N_CACHE_FINGERPRINT_BLOCK_SIZE:
+        f.seek(0)
+        n_bytes_left = n_size
+        while n_bytes_left > 0:
+            b_block = f.read(min(N_DEFAULT_CHUNK_SIZE, n_bytes_left))
+            if not b_block:
+                break
+            h.update(b_block)
+            n_bytes_left -= len(b_block)
+    else:
+        f.seek(0)
+        h.update(f.read(N_CACHE_FINGERPRINT_BLOCK_SIZE))
+        f.seek(n_size - N_CACHE_FINGERPRINT_BLOCK_SIZE)
+        h.update(f.read(N_CACHE_FINGERPRINT_BLOCK_SIZE))
+
+    return h.hexdigest()
+
+def last_word_boundary(f, i_start, i_end):
+    """
+    This function returns the offset just past the last whitespace byte of the (binary) file object f within [i_start, i_end), or i_start if there is none.
+
+    Bytes past that offset are a (possibly partial) word that may still be extended if the file grows.
+    """
+
+    i_block_end = i_end
+    while i_block_end > i_start:
+        i_block_start = max(i_start, i_block_end - N_CACHE_FINGERPRINT_BLOCK_SIZE)
+        f.seek(i_block_start)
+        b_block = f.read(i_block_end - i_block_start)
+        for m in RE_WHITESPACE_BYTE.finditer(b_block[::-1]):   # (the first match in the reversed block is the last whitespace)
+            return i_block_start + len(b_block) - m.start()
+        i_block_end = i_block_start
+
+    return i_start
+
+def evict_cache_entries(s_cache_dir, n_max_entries=N_DEFAULT_CACHE_MAX_ENTRIES, n_max_bytes=N_DEFAULT_CACHE_MAX_BYTES):
+    """
+    This function evicts the least recently used entries (by file modification time, which inverted_index_cached() touches on every use) of the result cache
+        until there are no more than n_max_entries entries taking no more than n_max_bytes bytes.
+    """
+
+    l_entries = []
+    for fname_entry in glob.glob(os.path.join(s_cache_dir, "*.pkl")):
+        try:
+            st = os.stat(fname_entry)
+            l_entries.append((st.st_mtime_ns, st.st_size, fname_entry))
+        except OSError:     # already gone
+            pass
+
+    l_entries.sort(reverse=True)    # most recently used first
+    n_bytes = 0
+    for i, (_, n_entry_size, fname_entry) in enumerate(l_entries):
+        n_bytes += n_entry_size
+        if i >= n_max_entries or n_bytes > n_max_bytes:
+            try:
+                os.remove(fname_entry)
+            except OSError:
+                pass
+
+def inverted_index_cached(fname, s_cache_dir=S_DEFAULT_CACHE_DIR, n_max_entries=N_DEFAULT_CACHE_MAX_ENTRIES, n_max_bytes=N_DEFAULT_CACHE_MAX_BYTES, b_full_hash=False):
+    """
+    This function returns the same word and character counts as tokens_list_to_inverted_index() on the words of fname, through an on-disk result cache.
+
+    Each cache entry (one per file path) records the file identity: path, size, mtime and a content fingerprint (see file_fingerprint()), along with the counts.
+        1. if the file is unchanged, the cached counts are returned (no tokenization at all)
+        2. if the file has only been APPENDED to (it is larger and the fingerprint of its first <cached size> bytes still matches),
+            only the new bytes are tokenized and merged into the cached counts
+        3. otherwise (including a file modified without changing size, which cannot be an append) the file is counted from scratch
+
+    To make appends safe, the cached counts only cover the file up to its last whitespace byte: the (possibly partial) last word is re-counted on every call,
+        since an append may extend it.
+
+    The cache keeps at most n_max_entries entries / n_max_bytes bytes, evicting the least recently used ones (see evict_cache_entries()).
+
+    returns:
+        d_w_index, d_c_index
+    """
+
+    s_path = os.path.abspath(fname)
+    fname_entry = os.path.join(s_cache_dir, hashlib.sha1(s_path.encode("utf-8")).hexdigest() + ".pkl")
+    b_can_append = codecs.lookup(locale.getpreferredencoding(False)).name in S_ASCII_COMPATIBLE_ENCODINGS
+
+    d_entry = None
+    try:
+        with open(fname_entry, 'rb') as f_entry:
+            d_entry = pickle.load(f_entry)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        pass
+
+    st = os.stat(fname)
+    with open(fname, 'rb') as f_words:
+        n_size = st.st_size
+
+        i_start = 0
+        d_w_index, d_c_index = {}, {}
+        b_unchanged = False
+        if d_entry is not None and d_entry["path"] == s_path and n_size >= d_entry["size"]:
+            b_unchanged = n_size == d_entry["size"] and st.st_mtime_ns == d_entry["mtime_ns"]
+            b_appended = n_size > d_entry["size"] and b_can_append
+            if (b_unchanged or b_appended) and file_fingerprint(f_words, d_entry["size"], b_full_hash) == d_entry["fingerprint"]:
+                i_start = d_entry["n_committed"]
+                d_w_index, d_c_index = d_entry["d_w_index"], d_entry["d_c_index"]
+            else:
+                b_unchanged = False
+
+        n_committed = last_word_boundary(f_words, i_start, n_size) if b_can_append else n_size
+
+    if i_start < n_committed:
+        _, d_w_new, d_c_new = inverted_index_of_byte_range((fname, i_start, n_committed))
+        merge_inverted_indices([(d_w_new, d_c_new)], d_w_index, d_c_index)
+
+    os.makedirs(s_cache_dir, exist_ok=True)
+    if b_unchanged:
+        os.utime(fname_entry)   # (just mark the entry as recently used)
+    else:
+        with open(fname, 'rb') as f_words:
+            s_fingerprint = file_fingerprint(f_words, n_size, b_full_hash)
+        d_entry = {
+            "path": s_path,
+            "size": n_size,
+            "mtime_ns": st.st_mtime_ns,
+            "fingerprint": s_fingerprint,
+            "n_committed": n_committed,
+            "d_w_index": d_w_index,
+            "d_c_index": d_c_index
+        }
+        # write to a temporary file first, so that an interrupted write never leaves a corrupt entry behind
+        fname_entry_tmp = f"{fname_entry}.{os.getpid()}.tmp"
+        with open(fname_entry_tmp, 'wb') as f_entry:
+            pickle.dump(d_entry, f_entry, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(fname_entry_tmp, fname_entry)
+        evict_cache_entries(s_cache_dir, n_max_entries, n_max_bytes)
+
+    # the (possibly partial) last word is never cached (see above), so it is counted on top of a COPY of the cached counts
+    if n_committed < n_size:
+        _, d_w_tail, d_c_tail = inverted_index_of_byte_range((fname, n_committed, n_size))
+        d_w_index, d_c_index = merge_inverted_indices([(d_w_index, d_c_index), (d_w_tail, d_c_tail)])
+
+    return d_w_index, d_c_index
 
-            # now we use the fact that elements in l are comparable... this happens recursively
-            if target_value < val_at_midpoint:  # then we look in the left half... this is the binary split
-                return bisect(l, i_lb, i_midpoint, target_value, debug)
+def summarize_text_file_cached(fname, s_cache_dir=S_DEFAULT_CACHE_DIR, n_max_entries=N_DEFAULT_CACHE_MAX_ENTRIES, n_max_bytes=N_DEFAULT_CACHE_MAX_BYTES, b_full_hash=False):
+    """
+    This function is summarize_text_file() on top of the result cache (see inverted_index_cached()): unchanged files are not re-read, and appended files only have their new bytes read.
 
-            else:   # otherwise we look in the right half... this happens recursively
-                return bisect(l, i_midpoint, i_ub, target_value, debug)
+    returns:
+        the same 3 things as summarize_text_file()
+    """
 
-    else: # i_ub < i_lb  (which is illogical, therefore return None)
-        return None
+    d_w_index, d_c_index = inverted_index_cached(fname, s_cache_dir, n_max_entries, n_max_bytes, b_full_hash)
 
-def test_bisect(l, i_lb, i_ub, target_value, debug=True):
-    result = bisect(l, i_lb, i_ub, target_value, debug=debug)
-    print(f"\tTEST bisect(l={l if len(l)<50 else '<l contents SUPRESSED due to length>'}, i_lb={i_lb}, i_ub={i_ub}, target_value={target_value}): {result}")
+    return format_text_file_summary(fname, d_w_index, d_c_index)
 
+def test_inverted_index_cached(fname, n_copies=36):
+    """
+    This test checks inverted_index_cached() against counting from scratch (tokens_list_to_inverted_index(words_file_to_list())) as a copy of fname is modified
+        in the ways the cache has to tell apart:
+            an append that splits a word (the file ends mid-word, and the append finishes that word), then a second append
+            a truncation
+            a same-size in-place edit (in the middle of the file, where the default head/tail fingerprint does not look)
 
-def process_token_to_word(tkn):
+    The text of fname is repeated n_copies times so that the copy is bigger than what file_fingerprint() hashes in full.
     """
-    This function's sole purpose is to "clean" a token and return a word (or None if the token is not actually a word).
 
-    For instance, we want to strip preceding and trailing whitespace if any exists.
+    with open(fname, 'r') as f_words:
+        s_text = f_words.read() * n_copies
 
-    We also want to remove punctuation characters.
-    """
+    with tempfile.TemporaryDirectory() as s_tmp_dir:
+        fname_test = os.path.join(s_tmp_dir, os.path.basename(fname))
+        s_cache_dir = os.path.join(s_tmp_dir, "cache")
 
-    if tkn is None:
-        return None
+        def write_and_check(s_case, s_mode, s_content):
+            with open(fname_test, s_mode) as f_test:
+                f_test.write(s_content)
+            # (make sure the change is visible to the cache even when it happens within the resolution of the file system clock)
+            st = os.stat(fname_test)
+            os.utime(fname_test, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
 
-    tkn = tkn.strip()
-        
-    # strip punctuation
-    tkn = re.sub(r"[^\w\s]", "", tkn)
-    
-    if len(tkn) == 0:
-        return None
+            b_result = inverted_index_cached(fname_test, s_cache_dir) == tokens_list_to_inverted_index(words_file_to_list(fname_test))
+            print(f"\tTEST inverted_index_cached(fname=<{n_copies} x {fname}>) after {s_case}: {b_result}")
 
-    return tkn
+        write_and_check("first call (empty cache)", 'w', s_text.rstrip() + " Moby Di")
+        write_and_check("an append that splits a word", 'a', "ck the white wh")
+        write_and_check("a second append", 'a', "ale.\n")
+        write_and_check("a truncation", 'w', s_text[:len(s_text) // 3])
+        i_edit = len(s_text) // 6
+        write_and_check("a same-size in-place edit", 'w', s_text[:i_edit] + "Queequeg" + s_text[i_edit + len("Queequeg"):len(s_text) // 3])
 
-def tokens_list_to_inverted_index(l_tokens, fn_process_token_to_word=process_token_to_word, debug=False):
-    """
-    This function converts a list of tokens into two dictionaries:
-        1. the first dictionary is keyed by each unqiue word and the corresponding value is the count of that word
-        2. the second dictionary is keyed by each unqiue character and the corresponding value is the count of that character
 
-    The above happens AFTER the token is cleaned by the function specified by the fn_process_token_to_word argument
+def anagram_signature(word, normalize_char_case=True):
     """
+    This function returns the canonical signature of a word: its (per-char lower-cased, when normalize_char_case) chars in sorted order.
 
-    d_w_index = {}
-    d_c_index = {}
-    
-    for tkn in l_tokens:
-        w = fn_process_token_to_word(tkn)
+    Two words are anagrams (in the sense of is_anagram()) exactly when they have the same signature.
+    """
 
-        if w is not None:
-            w_lower = w.lower()
-            d_w_index[w_lower] = d_w_index.get(w_lower, 0) + 1
-            
-            for c in w:
-                d_c_index[c] = d_c_index.get(c, 0) + 1
+    if normalize_char_case:
+        return "".join(sorted([c.lower() for c in word]))
+    return "".join(sorted(word))
 
-    return d_w_index, d_c_index
+class AnagramIndex:
+    """
+    This is an index of a vocabulary (e.g. the output of words_file_to_list()) by anagram_signature(), built once in O(total length of the words).
 
+    Afterwards:
+        find(word)  returns every word of the vocabulary that is an anagram of word (including word itself, if it is in the vocabulary) with a single dictionary probe
+        groups()    returns all the anagram groups, in one linear pass over the index
 
-def summarize_text_file(fname):
+    Tokens are first cleaned by fn_process_token_to_word (like tokens_list_to_inverted_index() does), and when normalize_char_case they are stored lower-cased,
+        so that e.g. "Never" and "never" count as the same word.
     """
-    This function opens a text file and summarizes its word count and letter count.
 
-    Note that case matters!
+    def __init__(self, l_words, normalize_char_case=True, fn_process_token_to_word=process_token_to_word):
+        self.normalize_char_case = normalize_char_case
+        self.d_index = {}
+
+        s_seen = set()
+        for tkn in l_words:
+            w = fn_process_token_to_word(tkn) if fn_process_token_to_word is not None else tkn
+            if w is None:
+                continue
+            if normalize_char_case:
+                w = "".join([c.lower() for c in w])
+            if w in s_seen:
+                continue
+            s_seen.add(w)
+
+            s_signature = anagram_signature(w, normalize_char_case=False)    # (w has already been lower-cased if need be)
+            l_group = self.d_index.get(s_signature)
+            if l_group is None:
+                self.d_index[s_signature] = [w]
+            else:
+                l_group.append(w)
 
-    arguments:
-        fname
+    def __len__(self):
+        return len(self.d_index)
 
-    returns:
-        1. the summary string, which is formatted, containing the summary statistics:
-            1. the frequency count that each (case-sensitive) letter occurs (out of the total number of letters), as well as the frequency ratio (as a percentage)
-            2. the frequency (count and ratio) of upper-case letters as a group
-            3. the frequency (count and ratio) of lower-case letters as a group
+    def find(self, word):
+        return list(self.d_index.get(anagram_signature(word, self.normalize_char_case), []))
 
-        2. a dictionary keyed by words, containing the count of each unique word
+    def groups(self, n_min_group_size=2):
+        return [list(l_group) for l_group in self.d_index.values() if len(l_group) >= n_min_group_size]
 
-        3. a dictionary keyed by letter, containing the count of each unique letter
+def test_anagram_index(l_words, n_targets=50):
+    """
+    This test builds an AnagramIndex of l_words and checks it against pairwise is_anagram__sorted() calls over the (cleaned, lower-cased) vocabulary:
+        find() of every n_targets-th vocabulary word (and of its upper-cased, reversed spelling) returns exactly its anagrams,
+        and groups() partitions the vocabulary into groups of mutual anagrams that no other word belongs to.
+    """
+
+    anagram_index = AnagramIndex(l_words)
+    l_vocab = sorted(set("".join([c.lower() for c in w]) for w in map(process_token_to_word, l_words) if w is not None))
+
+    b_find = all(
+        sorted(anagram_index.find(s_target)) == [v for v in l_vocab if is_anagram__sorted(w, v)]
+        for w in l_vocab[::max(1, len(l_vocab) // n_targets)] for s_target in (w, w[::-1].upper())
+    )
+    l_groups = anagram_index.groups(n_min_group_size=1)
+    b_groups = sorted(w for l_group in l_groups for w in l_group) == l_vocab \
+        and all(is_anagram__sorted(l_group[0], w) for l_group in l_groups for w in l_group) \
+        and len(set(anagram_signature(l_group[0]) for l_group in l_groups)) == len(l_groups)
+
+    b_result = b_find and b_groups
+    print(f"\tTEST AnagramIndex(l=<{len(l_words)} words>) ({len(anagram_index.groups())} anagram groups) find() and groups() == pairwise is_anagram(): {b_result}")
 
+class ToggleCaseMap(dict):
     """
+    This is a str.translate() table that toggles the case of ANY (Unicode) character, with exactly the same semantics as words_file_to_toggle_case()'s original per-char logic:
+        alphabetic upper-case chars are lowered, any other alphabetic char is uppered, and non-alphabetic chars are left alone.
 
-    l_words = words_file_to_list(fname, use_list_append=False)
+    Entries are computed on first use (via __missing__) and then cached, so a text only pays the Python-level cost once per distinct char.
+    """
 
-    d_w_index, d_c_index = tokens_list_to_inverted_index(l_words)
+    def __missing__(self, i_c):
+        c = chr(i_c)
+        if c.isalpha():
+            c_toggled = c.lower() if c.isupper() else c.upper()
+        else:
+            c_toggled = c
+        self[i_c] = c_toggled
+        return c_toggled
 
-    n_words = 0
-    for k in d_w_index.keys():
-        n_words += d_w_index[k]
+D_TOGGLE_CASE_MAP = ToggleCaseMap()
 
-    # re-arrange d_c_index so that keys are in alphabetical order (based on sorted() order)
-    d_c_index = {k:d_c_index[k] for k in sorted(d_c_index.keys())}
+def toggle_case(s):
+    """
+    This function toggles the case of a whole block of text in one (C-level) pass:
+        pure-ASCII text goes through the B_TOGGLE_CASE_ASCII_TABLE bytes translation, anything else through the (cached) Unicode D_TOGGLE_CASE_MAP.
+    """
 
-    # count all letters (so that we can provide frequency of each letter as a ratio or percentage)
-    n_c_all = sum([n_c for _, n_c in d_c_index.items()])
+    if s.isascii():
+        return s.encode("ascii").translate(B_TOGGLE_CASE_ASCII_TABLE).decode("ascii")
+    return s.translate(D_TOGGLE_CASE_MAP)
 
-    # now create separate counts of upper and lower case letter (and create formatted individual letter freq summary)
-    s_letter_freq__all = ""
-    n_c_uc = 0
-    n_c_lc = 0
-    for c, n_c in d_c_index.items():
-        s_letter_freq__all += "\t\t\t" + LETTER_FREQ_TEMPLATE.format(c, n_c, n_c_all, (n_c/n_c_all)*100) + "\n"
+def words_file_to_toggle_case__mmap(fname_in, fname_out, n_block_size=N_DEFAULT_BLOCK_SIZE):
+    """
+    This function is the memory-mapped variant of words_file_to_toggle_case(..., use_mmap=True).
 
-        if c.isalpha():
-            if c.isupper():
-                n_c_uc += n_c
-            else:
-                n_c_lc += n_c
+    Blocks of raw bytes are taken straight from the memory-mapped input: a pure-ASCII block without any '\r' is case-swapped and written as bytes, without ever being decoded.
+        Any other block goes through an incremental decoder (which also takes care of multi-byte chars split across blocks and of universal newlines, just like text-mode reading does)
+        and then toggle_case().
 
-    # now create summary strings of upper and lower case freqs
-    s_letter_freq__ucase = "\t" + LETTER_FREQ_TEMPLATE.format("UPPER-CASE", n_c_uc, n_c_all, (n_c_uc/n_c_all)*100)
-    s_letter_freq__lcase = "\t" + LETTER_FREQ_TEMPLATE.format("LOWER-CASE", n_c_lc, n_c_all, (n_c_lc/n_c_all)*100)
+    Must only be used with an ASCII-compatible encoding.
+    """
 
-    # return entire formatted summary string as well as the dictionaries (in case we want to use them later)
-    return TEXT_FILE_SUMMARY_TEMPLATE.format(
-        fname,
-        n_words,
-        s_letter_freq__all,
-        s_letter_freq__ucase,
-        s_letter_freq__lcase
-    ), d_w_index, d_c_index
+    s_encoding = locale.getpreferredencoding(False)
+    b_linesep = os.linesep.encode(s_encoding)
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(s_encoding)(), translate=True)
+
+    def encode_block(s_block):
+        # mirror text-mode writing: '\n' is written as os.linesep
+        b_block = s_block.encode(s_encoding)
+        return b_block if b_linesep == b"\n" else b_block.replace(b"\n", b_linesep)
+
+    with open(fname_in, 'rb') as f_words_in:
+        with open(fname_out, 'wb') as f_words_out:
+            if os.fstat(f_words_in.fileno()).st_size == 0:  # an empty file cannot be memory-mapped
+                return
+            with mmap.mmap(f_words_in.fileno(), 0, access=mmap.ACCESS_READ) as mm_words_in:
+                for i_block_start in range(0, len(mm_words_in), n_block_size):
+                    b_block = mm_words_in[i_block_start:i_block_start + n_block_size]
+
+                    # the bytes fast path is only valid when the decoder holds no partial char and no pending '\r' from the previous block
+                    if b_block.isascii() and b"\r" not in b_block and decoder.getstate() == (b"", 0):
+                        b_block = b_block.translate(B_TOGGLE_CASE_ASCII_TABLE)
+                        f_words_out.write(b_block if b_linesep == b"\n" else b_block.replace(b"\n", b_linesep))
+                    else:
+                        f_words_out.write(encode_block(toggle_case(decoder.decode(b_block))))
+
+                f_words_out.write(encode_block(toggle_case(decoder.decode(b"", final=True))))
 
+def words_file_to_toggle_case(fname_in, fname_out, use_block_io=True, use_mmap=False, n_block_size=N_DEFAULT_BLOCK_SIZE):
+    """
+    This function writes a copy of fname_in to fname_out in which the case of every letter is toggled (upper-case becomes lower-case and vice versa).
+
+    arguments:
+        fname_in
+        fname_out
+        use_block_io:   when True (the default), n_block_size chars are read at a time and case-swapped in a single pass by toggle_case()
+                        when False, the original line-by-line, char-by-char implementation is used
+        use_mmap:       when True (and the encoding is ASCII-compatible), the input is memory-mapped and pure-ASCII blocks are swapped as raw bytes (see words_file_to_toggle_case__mmap())
+        n_block_size
+
+    All the variants write byte-for-byte the same output.
+    """
 
-def words_file_to_toggle_case(fname_in, fname_out):
     try:
-        with open(fname_in, 'r') as f_words_in:
-            with open(fname_out, 'w') as f_words_out:
+        with instrumented_stage("toggle-case"):
+            words_file_to_toggle_case__impl(fname_in, fname_out, use_block_io, use_mmap, n_block_size)
+        count_metric("toggle_case_bytes", os.path.getsize(fname_in))
+    except Exception as e:
+        print(f"words_file_to_toggle_case: ***RUNTIME ERROR caught***: {e}")
+
+def words_file_to_toggle_case__impl(fname_in, fname_out, use_block_io, use_mmap, n_block_size):
+    if use_mmap and codecs.lookup(locale.getpreferredencoding(False)).name in S_ASCII_COMPATIBLE_ENCODINGS:
+        words_file_to_toggle_case__mmap(fname_in, fname_out, n_block_size)
+        print(f"{fname_out} file written")
+        return
+
+    with open(fname_in, 'r') as f_words_in:
+        with open(fname_out, 'w') as f_words_out:
+            if use_block_io:
+                for s_block_in in iter(lambda: f_words_in.read(n_block_size), ""):
+                    f_words_out.write(toggle_case(s_block_in))
+            else:
                 for words_line_in in f_words_in:
                     words_line_out = ""
                     for c_in in words_line_in:
@@ -492,18 +2935,497 @@ def words_file_to_toggle_case(fname_in, fname_out):
                         else:
                             words_line_out += c_in
                     f_words_out.write(words_line_out)
-                f_words_out.close()
-                print(f"{fname_out} file written")
-            f_words_in.close()
-    except Exception as e:
-        print(f"words_file_to_toggle_case: ***RUNTIME ERROR caught***: {e}")
-# ******************** functions: END ********************
+            f_words_out.close()
+            print(f"{fname_out} file written")
+        f_words_in.close()
+
 
+class WordListConsumer:
+    """
+    This run_fused_pipeline() consumer collects the tokens of the file: its result is the same list as words_file_to_list().
+    """
 
+    def __init__(self):
+        self.l_words = []
 
+    def consume(self, s_chunk):
+        self.l_words.extend(s_chunk.split())
+
+    def finish(self):
+        return self.l_words
+
+class SummaryConsumer:
+    """
+    This run_fused_pipeline() consumer counts words and chars: its result is the same as summarize_text_file(fname, tokenizer=tokenizer) (see count_text_chunk()).
+    """
+
+    def __init__(self, fname, tokenizer=S_DEFAULT_TOKENIZER):
+        self.fname = fname
+        self.tokenizer = tokenizer
+        self.counter_w = Counter()
+        self.char_counts = CharCounts()
+
+    def consume(self, s_chunk):
+        count_text_chunk(s_chunk, self.counter_w, self.char_counts, self.tokenizer)
+
+    def finish(self):
+        return format_text_file_summary(self.fname, dict(self.counter_w), self.char_counts.to_dict(), t_case_totals=(self.char_counts.n_upper(), self.char_counts.n_lower()))
+
+class ToggleCaseConsumer:
+    """
+    This run_fused_pipeline() consumer writes the case-toggled text to fname_out: the file is the same as the one words_file_to_toggle_case() writes.
+        (The chunks put back together are the whole text, and toggling is char by char, so toggling chunk by chunk gives the same output.)
+    """
+
+    def __init__(self, fname_out):
+        self.fname_out = fname_out
+        self.f_out = open(fname_out, 'w')
+
+    def consume(self, s_chunk):
+        self.f_out.write(toggle_case(s_chunk))
+
+    def finish(self):
+        self.f_out.close()
+        print(f"{self.fname_out} file written")
+        return self.fname_out
+
+def run_fused_pipeline(fname, l_consumers, n_chunk_size=N_DEFAULT_CHUNK_SIZE):
+    """
+    This function reads (and decodes) fname ONCE and feeds the same word-aligned chunks (see iter_file_text_chunks()) to every consumer in turn,
+        instead of each stage opening and scanning the file on its own.
+
+    A consumer is any object with a consume(s_chunk) method, called with every chunk in order, and a finish() method, called once at the end, which returns its result.
+        See WordListConsumer, SummaryConsumer and ToggleCaseConsumer.
+
+    Usage:
+        l_words, (s_summary, d_w_index, d_c_index), _ = run_fused_pipeline(fname, [WordListConsumer(), SummaryConsumer(fname), ToggleCaseConsumer(fname_out)])
+
+    returns:
+        the list of the results of the consumers (in the order of l_consumers)
+    """
+
+    with instrumented_stage("fused"):
+        for s_chunk in iter_file_text_chunks(fname, n_chunk_size):
+            for consumer in l_consumers:
+                consumer.consume(s_chunk)
+
+        return [consumer.finish() for consumer in l_consumers]
+
+
+def service_summarize_task(fname):
+    """
+    Executor task of the summarization service: the summary of a file (only what the response needs, to keep what is sent back from a worker process small).
+    """
+
+    s_summary, d_w_index, d_c_index = summarize_text_file(fname)
+    return {"summary": s_summary, "word_count": sum(d_w_index.values()), "unique_words": len(d_w_index), "letter_counts": d_c_index}
+
+def service_vocabulary_task(fname):
+    """
+    Executor task of the summarization service: what word lookups need to answer like bisect() on the sorted word list of a file, without keeping that (whole) list:
+        the sorted unique words, and the index of the first occurrence of each of them in the sorted word list.
+    """
+
+    counter_w = Counter(words_file_to_list(fname))
+    l_vocab = sorted(counter_w)
+
+    return l_vocab, list(accumulate([counter_w[w] for w in l_vocab[:-1]], initial=0))
+
+def service_anagram_index_task(fname):
+    """
+    Executor task of the summarization service: the AnagramIndex of a file.
+    """
+
+    return AnagramIndex(words_file_to_list(fname))
+
+def approx_nbytes(obj):
+    """
+    This function estimates the memory taken by obj and everything it holds (dictionaries, lists, tuples, sets, and the attributes of plain objects).
+
+    Objects shared by several containers are counted every time, so this errs on the high side.
+    """
+
+    n_bytes = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        n_bytes += sum([approx_nbytes(k) + approx_nbytes(v) for k, v in obj.items()])
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        n_bytes += sum([approx_nbytes(e) for e in obj])
+    elif hasattr(obj, "__dict__"):
+        n_bytes += approx_nbytes(vars(obj))
+
+    return n_bytes
+
+def service_run_task(fn_task, fname):
+    """
+    This function runs an executor task of the summarization service, and estimates the size of its result (in the worker, not in the event loop).
+
+    returns:
+        fn_task(fname), approx_nbytes(fn_task(fname))
+    """
+
+    result = fn_task(fname)
+    return result, approx_nbytes(result)
+
+class SummaryService:
+    """
+    This is a local, asyncio-based HTTP/JSON service exposing (for the text files under s_root_dir):
+        GET /summarize?file=<fname>             summarize_text_file()
+        GET /lookup?file=<fname>&word=<word>    index of (the first occurrence of) word in the sorted word list of the file (like bisect_many()), or null
+        GET /anagrams?file=<fname>&word=<word>  every word of the file that is an anagram of word (see AnagramIndex)
+        GET /health
+
+    CPU-heavy work (summaries, building the vocabularies and anagram indices) runs in an executor pool, at most n_max_concurrency at a time.
+        Identical requests that arrive while the computation is in flight share it (they all await the same task) instead of triggering N computations.
+        A request that is cancelled (e.g. its client went away) only stops waiting: the computation carries on for the other requests, and is still cached.
+        Results are kept in an LRU cache of (at most) n_cache_max_entries entries taking (at most) n_cache_max_bytes bytes (as estimated by approx_nbytes()).
+        Cache keys include the size and mtime of the file, so a modified file is never served stale results.
+
+    Files are resolved relative to s_root_dir and anything outside it is refused, so only local files under that directory are ever read.
+    """
+
+    def __init__(self, s_root_dir=".", use_processes=True, workers=None, n_max_concurrency=N_DEFAULT_SERVICE_CONCURRENCY, n_cache_max_entries=N_DEFAULT_SERVICE_CACHE_ENTRIES, n_cache_max_bytes=N_DEFAULT_SERVICE_CACHE_BYTES):
+        self.s_root_dir = os.path.realpath(s_root_dir)
+        self.executor = ProcessPoolExecutor(max_workers=workers) if use_processes else ThreadPoolExecutor(max_workers=workers)
+        self.n_max_concurrency = n_max_concurrency
+        self.semaphore = None   # (created lazily, inside the running event loop)
+        self.n_cache_max_entries = n_cache_max_entries
+        self.n_cache_max_bytes = n_cache_max_bytes
+        self.d_cache = OrderedDict()    # key -> (result, estimated size in bytes)
+        self.n_cache_bytes = 0
+        self.d_in_flight = {}
+        self.n_computations = 0
+
+    def resolve_file(self, fname):
+        s_path = os.path.realpath(os.path.join(self.s_root_dir, fname))
+        if s_path == self.s_root_dir or os.path.commonpath([self.s_root_dir, s_path]) != self.s_root_dir:
+            raise PermissionError(f"{fname} is outside of the service root")
+        if not os.path.isfile(s_path):
+            raise FileNotFoundError(f"{fname} not found")
+        return s_path
+
+    async def get_or_compute(self, fn_task, s_path):
+        """
+        This method returns fn_task(s_path) from the cache, from an identical in-flight computation, or from a new computation in the executor pool.
+        """
+
+        import asyncio
+
+        st = os.stat(s_path)
+        key = (fn_task.__name__, s_path, st.st_size, st.st_mtime_ns)
+
+        if key in self.d_cache:
+            self.d_cache.move_to_end(key)
+            return self.d_cache[key][0]
+
+        # the computation is a task of its own, which every identical request awaits through a shield: cancelling a request never cancels (or orphans) it
+        task = self.d_in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.compute(key, fn_task, s_path))
+            self.d_in_flight[key] = task
+            task.add_done_callback(lambda task: self.on_computed(key, task))
+
+        return await asyncio.shield(task)
+
+    async def compute(self, key, fn_task, s_path):
+        import asyncio
+
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.n_max_concurrency)
+        async with self.semaphore:
+            self.n_computations += 1
+            result, n_bytes = await asyncio.get_running_loop().run_in_executor(self.executor, service_run_task, fn_task, s_path)
+
+        if n_bytes <= self.n_cache_max_bytes:   # (a result bigger than the whole cache is served, but not cached)
+            self.d_cache[key] = (result, n_bytes)
+            self.n_cache_bytes += n_bytes
+            while len(self.d_cache) > self.n_cache_max_entries or self.n_cache_bytes > self.n_cache_max_bytes:
+                _, (_, n_evicted_bytes) = self.d_cache.popitem(last=False)
+                self.n_cache_bytes -= n_evicted_bytes
+
+        return result
+
+    def on_computed(self, key, task):
+        del self.d_in_flight[key]
+        if not task.cancelled():
+            task.exception()    # (marks an exception as retrieved, in case every request waiting on it was cancelled)
+
+    async def handle_request(self, s_path, d_query):
+        """
+        This method answers one request (independently of HTTP, which makes it easy to test).
+
+        returns:
+            the HTTP status code and the JSON-serializable response body
+        """
+
+        try:
+            if s_path == "/health":
+                return 200, {"status": "ok", "cached": len(self.d_cache), "cached_bytes": self.n_cache_bytes, "in_flight": len(self.d_in_flight), "computations": self.n_computations}
+
+            if s_path not in ("/summarize", "/lookup", "/anagrams"):
+                return 404, {"error": f"unknown endpoint {s_path}"}
+            if "file" not in d_query:
+                return 400, {"error": "missing 'file' parameter"}
+            s_file = self.resolve_file(d_query["file"])
+
+            if s_path == "/summarize":
+                return 200, {"file": d_query["file"], **await self.get_or_compute(service_summarize_task, s_file)}
+
+            if "word" not in d_query:
+                return 400, {"error": "missing 'word' parameter"}
+            word = d_query["word"]
+
+            if s_path == "/lookup":
+                l_vocab, l_first_indices = await self.get_or_compute(service_vocabulary_task, s_file)
+                i = bisect_left(l_vocab, word)
+                i = l_first_indices[i] if i < len(l_vocab) and l_vocab[i] == word else None
+                return 200, {"file": d_query["file"], "word": word, "index": i, "found": i is not None}
+
+            anagram_index = await self.get_or_compute(service_anagram_index_task, s_file)
+            return 200, {"file": d_query["file"], "word": word, "anagrams": anagram_index.find(word)}
+
+        except PermissionError as e:
+            return 403, {"error": str(e)}
+        except FileNotFoundError as e:
+            return 404, {"error": str(e)}
+        except Exception as e:
+            print(f"SummaryService: ***RUNTIME ERROR caught***: {e}")
+            return 500, {"error": str(e)}
+
+    async def handle_connection(self, reader, writer):
+        """
+        This method speaks just enough HTTP/1.1 for GET requests with a JSON response (one request per connection).
+        """
+
+        import asyncio
+
+        n_status = 400
+        d_body = {"error": "bad request"}
+        try:
+            b_request = await reader.readuntil(b"\r\n\r\n")
+            s_method, s_target, _ = b_request.split(b"\r\n", 1)[0].decode("latin-1").split(" ", 2)
+            if s_method != "GET":
+                n_status, d_body = 405, {"error": "only GET is supported"}
+            else:
+                url = urlsplit(s_target)
+                n_status, d_body = await self.handle_request(url.path, {k: l_v[0] for k, l_v in parse_qs(url.query).items()})
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        except OSError:     # (e.g. ConnectionResetError: the client went away, so there is no one to answer)
+            writer.close()
+            return
+
+        b_body = json.dumps(d_body).encode("utf-8")
+        s_reason = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed"}.get(n_status, "Internal Server Error")
+        try:
+            writer.write(f"HTTP/1.1 {n_status} {s_reason}\r\nContent-Type: application/json\r\nContent-Length: {len(b_body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + b_body)
+            await writer.drain()
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, s_host=S_DEFAULT_SERVICE_HOST, n_port=N_DEFAULT_SERVICE_PORT):
+        import asyncio
+
+        # the worker processes are started (forked) BEFORE the server socket exists: a worker forked on the first request would inherit the listening socket
+        #   and that request's connection, and keep the connection open (so a client reading until EOF would never see the end of the response)
+        await asyncio.get_running_loop().run_in_executor(self.executor, os.getpid)
+
+        server = await asyncio.start_server(self.handle_connection, s_host, n_port, limit=N_SERVICE_MAX_REQUEST_BYTES)
+        print(f"Summary service listening on http://{s_host}:{n_port} (serving files under {self.s_root_dir})...")
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown()
+
+def run_summary_service(s_root_dir=".", s_host=S_DEFAULT_SERVICE_HOST, n_port=N_DEFAULT_SERVICE_PORT, workers=None, n_max_concurrency=N_DEFAULT_SERVICE_CONCURRENCY, n_cache_max_entries=N_DEFAULT_SERVICE_CACHE_ENTRIES, n_cache_max_bytes=N_DEFAULT_SERVICE_CACHE_BYTES):
+    """
+    This function runs the SummaryService until interrupted (Ctrl+C).
+    """
+
+    import asyncio
+
+    service = SummaryService(s_root_dir, workers=workers, n_max_concurrency=n_max_concurrency, n_cache_max_entries=n_cache_max_entries, n_cache_max_bytes=n_cache_max_bytes)
+    try:
+        asyncio.run(service.serve(s_host, n_port))
+    except KeyboardInterrupt:
+        print(f"\n{QUIT_MESSAGE}\n")
+    finally:
+        service.close()
+
+
+def benchmark(fn, n_warmup=N_BENCHMARK_WARMUP, n_samples=N_BENCHMARK_SAMPLES):
+    """
+    This function times fn() (called with no arguments): n_warmup untimed calls (to warm up caches, the allocator, etc.), then n_samples timed calls (with time.perf_counter_ns()).
+
+    returns:
+        a dictionary of statistics (in seconds) over the samples: median, q1, q3, iqr, min, max (and the number of samples)
+    """
+
+    for _ in range(n_warmup):
+        fn()
+
+    l_samples = []
+    for _ in range(n_samples):
+        t0 = time.perf_counter_ns()
+        fn()
+        l_samples.append((time.perf_counter_ns() - t0) / 1e9)
+
+    q1, _, q3 = quantiles(l_samples, n=4) if len(l_samples) > 1 else (l_samples[0], None, l_samples[0])
+
+    return {
+        "median": median(l_samples),
+        "q1": q1,
+        "q3": q3,
+        "iqr": q3 - q1,
+        "min": min(l_samples),
+        "max": max(l_samples),
+        "n_samples": len(l_samples)
+    }
+
+def make_benchmark_input(fname, n_bytes, fname_out):
+    """
+    This function writes (approximately, to the nearest line) n_bytes of text to fname_out by repeating the lines of fname (so that the text keeps the same statistics).
+    """
+
+    with open(fname, 'r') as f_words:
+        l_lines = f_words.readlines()
+
+    n_written = 0
+    with open(fname_out, 'w') as f_out:
+        while n_written < n_bytes and l_lines:
+            for s_line in l_lines:
+                f_out.write(s_line)
+                n_written += len(s_line)
+                if n_written >= n_bytes:
+                    break
+
+def benchmark_stages(fname, n_warmup=N_BENCHMARK_WARMUP, n_samples=N_BENCHMARK_SAMPLES, l_stages=L_BENCHMARK_STAGES):
+    """
+    This function benchmarks every stage of the pipeline on the text file fname (see L_BENCHMARK_STAGES):
+        read:               words_file_to_list() (List.append() method)
+        read (t += [x]):    words_file_to_list(use_list_append=False)
+        tokenize:           process_token_to_word() over every token
+        index:              tokens_list_to_inverted_index()
+        summarize:          summarize_text_file()
+        toggle-case:        words_file_to_toggle_case() (to a temporary file)
+        bisect:             bisect() of 100 words (found and not found) in the sorted word list
+
+    returns:
+        a dictionary keyed by stage, containing the statistics returned by benchmark()
+    """
+
+    l_words = words_file_to_list(fname)
+    l_words_sorted = sorted(l_words)
+    l_targets = (l_words[::max(1, len(l_words) // 50)] + [w + "_" for w in l_words[:50]])[:100]
+
+    with tempfile.TemporaryDirectory() as s_tmp_dir:
+        fname_toggled = os.path.join(s_tmp_dir, "toggled.txt")
+
+        def toggle_case_quietly():
+            with contextlib.redirect_stdout(io.StringIO()):     # words_file_to_toggle_case() announces every file it writes
+                words_file_to_toggle_case(fname, fname_toggled)
+
+        d_stage_fns = {
+            "read": lambda: words_file_to_list(fname),
+            "read (t += [x])": lambda: words_file_to_list(fname, use_list_append=False),
+            "tokenize": lambda: [process_token_to_word(tkn) for tkn in l_words],
+            "index": lambda: tokens_list_to_inverted_index(l_words),
+            "summarize": lambda: summarize_text_file(fname),
+            "toggle-case": toggle_case_quietly,
+            "bisect": lambda: [bisect(l_words_sorted, 0, len(l_words_sorted)-1, target_value) for target_value in l_targets]
+        }
+
+        return {s_stage: benchmark(d_stage_fns[s_stage], n_warmup, n_samples) for s_stage in l_stages}
+
+def run_benchmark_suite(fname, l_sizes=L_BENCHMARK_INPUT_SIZES, fname_json_out=None, fname_baseline=None, f_tolerance=F_BENCHMARK_REGRESSION_TOLERANCE, n_warmup=N_BENCHMARK_WARMUP, n_samples=N_BENCHMARK_SAMPLES, l_stages=L_BENCHMARK_STAGES):
+    """
+    This function benchmarks every pipeline stage (see benchmark_stages()) over a sweep of input sizes, generated from fname (see make_benchmark_input()).
+
+    arguments:
+        fname
+        l_sizes:            the input sizes (in bytes) to sweep
+        fname_json_out:     if given, the results are written there as JSON (which can later serve as a baseline)
+        fname_baseline:     if given, a JSON file of earlier results to compare against (see compare_benchmark_results())
+        f_tolerance:        relative slowdown of the median beyond which a stage counts as a regression
+        n_warmup
+        n_samples
+        l_stages
+
+    returns:
+        1. the results dictionary (what gets written as JSON)
+        2. the list of regressions against the baseline (empty if there is no baseline)
+    """
+
+    print(f"Running benchmark suite on '{fname}' ({len(l_sizes)} input sizes x {len(l_stages)} stages, {n_samples} samples each)...")
+
+    d_results = {
+        "meta": {
+            "source": fname,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "n_warmup": n_warmup,
+            "n_samples": n_samples,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "results": []
+    }
+
+    with tempfile.TemporaryDirectory() as s_tmp_dir:
+        for n_bytes in l_sizes:
+            fname_input = os.path.join(s_tmp_dir, f"input-{n_bytes}.txt")
+            make_benchmark_input(fname, n_bytes, fname_input)
+            for s_stage, d_stats in benchmark_stages(fname_input, n_warmup, n_samples, l_stages).items():
+                d_results["results"].append({"stage": s_stage, "n_bytes": n_bytes, **d_stats})
+                print(f"\t{s_stage} ({n_bytes} bytes):\tmedian={d_stats['median']*1e3:0.3f} ms\tIQR={d_stats['iqr']*1e3:0.3f} ms")
+
+    if fname_json_out is not None:
+        with open(fname_json_out, 'w') as f_json_out:
+            json.dump(d_results, f_json_out, indent=2)
+        print(f"{fname_json_out} file written")
+
+    l_regressions = []
+    if fname_baseline is not None:
+        with open(fname_baseline, 'r') as f_baseline:
+            l_regressions = compare_benchmark_results(d_results, json.load(f_baseline), f_tolerance)
+
+    return d_results, l_regressions
+
+def compare_benchmark_results(d_results, d_baseline, f_tolerance=F_BENCHMARK_REGRESSION_TOLERANCE):
+    """
+    This function compares benchmark results to a baseline (both in the run_benchmark_suite() JSON format), matching them by stage and input size.
+
+    A stage regresses when its median is more than f_tolerance slower (relative) than the baseline's median AND the slowdown is larger than the spread (IQR) of both runs,
+        which keeps noisy stages from being flagged.
+
+    returns:
+        the list of regressions: dictionaries with keys stage, n_bytes, baseline_median, median, ratio
+    """
+
+    d_baseline_medians = {(d["stage"], d["n_bytes"]): d for d in d_baseline["results"]}
+
+    l_regressions = []
+    for d in d_results["results"]:
+        d_base = d_baseline_medians.get((d["stage"], d["n_bytes"]))
+        if d_base is None:
+            continue
+        f_ratio = d["median"] / max(d_base["median"], EPSILON)
+        if f_ratio > 1 + f_tolerance and d["median"] - d_base["median"] > max(d["iqr"], d_base["iqr"]):
+            l_regressions.append({"stage": d["stage"], "n_bytes": d["n_bytes"], "baseline_median": d_base["median"], "median": d["median"], "ratio": f_ratio})
+            print(f"\t***REGRESSION***: {d['stage']} ({d['n_bytes']} bytes) is {f_ratio:0.2f}x the baseline median ({d['median']*1e3:0.3f} ms vs {d_base['median']*1e3:0.3f} ms)")
+
+    if not l_regressions:
+        print("\tno regressions against the baseline")
+
+    return l_regressions
+
+
+def run_demo():
+    """
+    This function runs every stage in turn, with its tests and plots (it is what running this py file without a subcommand does).
+    """
 
-# **************************************** main body (simply calls main() when this py file is exec'ed from bash): BEGIN ****************************************
-if __name__ == '__main__':
     print("Testing is_sorted()...")
     test_is_sorted([1,2,2])
     test_is_sorted(['b','a'])
@@ -526,10 +3448,18 @@ if __name__ == '__main__':
     test_has_duplicates(["steven", "steven"])
     test_has_duplicates([0])
     test_has_duplicates([])
+    test_has_duplicates(["Steven", "steven"])
+    test_has_duplicates(["Steven", "steven"], disregard_char_case=True)
+    test_has_duplicates([[1], [2], [1]])    # (unhashable elements)
+    print()
+
+
+    run_bd_paradox_sim_series(N_SIM_SERIES, use_numpy=True, workers=None, reuse_draws=True) # note that for formatting purposes, the number of series should be an even number > 0
     print()
 
 
-    run_bd_paradox_sim_series(N_SIM_SERIES) # note that for formatting purposes, the number of series should be an even number > 0
+    print("Testing run_bd_paradox_sim_curve_np()...")
+    test_bd_paradox_sim_curve(10**5)
     print()
 
 
@@ -537,6 +3467,11 @@ if __name__ == '__main__':
     test_remove_duplicates("steven")
     test_remove_duplicates([1,2,3,4,2,1])
     test_remove_duplicates(['s','t','e','v','e','n'])
+    test_remove_duplicates("steven", preserve_order=True)
+    test_remove_duplicates([[3], [1], [3], [2]], preserve_order=True)   # (unhashable elements)
+    test_duplicates_vs_sorted([5, 1, 5] + list(range(1000)), "<an early duplicate in 1003 ints>")
+    test_duplicates_vs_sorted(list(range(1000)), "<1000 distinct ints>")
+    test_duplicates_vs_sorted([[3], [1], [3], [2]], "[[3], [1], [3], [2]]")
     print()
 
 
@@ -546,18 +3481,62 @@ if __name__ == '__main__':
 
 
     print("Testing bisect()...")
-    print(f"\tloading word list from {fname}...")
-    l_words = words_file_to_list(fname, use_list_append=False)
+    print(f"\tloading word list from {fname} (summarizing it and toggling its case in the same pass)...")
+    l_words, (s_text_file_summary, _, d_c_index), _ = run_fused_pipeline(fname, [WordListConsumer(), SummaryConsumer(fname), ToggleCaseConsumer("mobysmall-case-toggled.txt")])
     print(f"\t\tDONE")
     test_bisect(l_words, 0, len(l_words)-1, "a", debug=True)    # set debug to False for less output
+    l_sorted_words = sorted(l_words)
+    test_bisect(l_sorted_words, 0, len(l_sorted_words)-1, l_sorted_words[0], debug=False)
+    test_bisect(l_sorted_words, 0, len(l_sorted_words)-1, l_sorted_words[-1], debug=False)
+    test_bisect(l_sorted_words, 0, len(l_sorted_words)-1, " not a word", debug=False)       # (sorts before every word of fname)
+    test_bisect(l_sorted_words, 0, len(l_sorted_words)-1, "moby-dick", debug=False)         # (sorts between words)
+    test_bisect(l_sorted_words, 0, len(l_sorted_words)-1, "~~~", debug=False)               # (sorts after every word of fname)
+    print()
+
+
+    print("Testing SortedList()...")
+    test_sorted_list(l_words, f"<{len(l_words)} words from {fname}>")
+    test_sorted_list([random.randint(1, N_DAYS_IN_YEAR) for _ in range(1000)], "<1000 random birthdays>", typecode="q")
+    test_sorted_list(["b", "A", "a", "B"], "['b', 'A', 'a', 'B']")
+    print()
+
+
+    print("Testing AnagramIndex()...")
+    test_anagram_index(l_words)
+    test_anagram_index(["Never", "Even", "never", "veRne", "odd", "dod", "evens!"])
+    print()
+
+
+    print("Testing WordIndex()...")
+    test_word_index(l_words)
+    test_word_index([])
     print()
 
 
-    s_text_file_summary, _, d_c_index = summarize_text_file(fname)
     print(s_text_file_summary)
-    
 
-    words_file_to_toggle_case("mobysmall.txt", "mobysmall-case-toggled.txt")
+
+    print("Testing text_file_byte_shards()...")
+    test_text_file_byte_shards(fname, 1)
+    test_text_file_byte_shards(fname, 7)
+    test_text_file_byte_shards(fname, 1000)
+    print()
+
+
+    print("Testing inverted_index_cached()...")
+    test_inverted_index_cached(fname)
+    print()
+
+
+    print("Testing CorpusStore()...")
+    test_corpus_store(fname)
+    print()
+
+
+    print("Testing SpaceSaving()...")
+    test_space_saving(fname, 2**18)
+    test_space_saving(fname, 2**20)
+    print()
 
 
     try:
@@ -570,13 +3549,214 @@ if __name__ == '__main__':
 
 
     # histogram (bar chart) creation
-    fig = plt.figure(figsize=(8,4))
+    fig = make_figure()
+    axis = fig.subplots()
     x = d_c_index.keys()
     y = [d_c_index[c] for c in x]
-    plt.bar(x, y)
-    plt.title(f"Letter frequency for {fname}")
-    plt.show()
+    axis.bar(x, y)
+    axis.set_title(f"Letter frequency for {fname}")
+    show_or_save_figure(fig)
 
     
     print(f"\n{QUIT_MESSAGE}\n\n")
-# **************************************** main body (simply calls main() when this py file is exec'ed from bash): END ****************************************
\ No newline at end of file
+
+def cli_simulate(args):
+    n_class_size, is_leap_year = args.class_size, args.leap_year
+    t0 = time.perf_counter()
+    if args.adaptive is not None:
+        p, (p_lo, p_hi), n_sims = run_bd_paradox_sim_adaptive(args.adaptive, n_class_size=n_class_size, is_leap_year=is_leap_year, rng=args.seed)
+        d_result = {"p": p, "interval": [p_lo, p_hi], "n_sims": n_sims}
+    else:
+        # (a recorder even without --plot: it keeps the curve in kilobytes, where building it in full would take 16 bytes per simulation, only for p to be reported)
+        recorder = ConvergenceRecorder(args.sims, mode=args.recorder)
+        if args.python and args.seed is not None:
+            random.seed(args.seed)     # (the pure Python engine draws from the random module, not from a numpy generator)
+        p, x, y = run_bd_paradox_sim(args.sims, n_class_size=n_class_size, is_leap_year=is_leap_year, use_numpy=not args.python, rng=np.random.default_rng(args.seed) if not args.python else None, workers=args.workers, recorder=recorder)
+        d_result = {"p": p, "n_sims": args.sims}
+        if args.plot is not None:
+            fig = make_figure(headless=True)
+            axis = fig.subplots()
+            axis.plot(x, y)
+            axis.set_xscale("log" if args.recorder == "log" else "linear")
+            axis.set_title(f"# sims = {args.sims}, p = {p}")
+            show_or_save_figure(fig, args.plot)
+
+    return {"class_size": n_class_size, "leap_year": is_leap_year, **d_result, "p_exact": bd_paradox_exact_p(n_class_size, is_leap_year), "seconds": time.perf_counter() - t0}
+
+def cli_summarize(args):
+    if os.path.isdir(args.file):
+        with CorpusStore(args.file) as corpus_store:
+            s_summary, word_counts, d_c_index = summarize_text_file(corpus_store)
+    else:
+        s_summary, word_counts, d_c_index = summarize_text_file(args.file, streaming=not args.no_streaming, tokenizer=args.tokenizer or S_DEFAULT_TOKENIZER, n_word_memory_bytes=args.word_memory * 2**20 if args.word_memory is not None else None)
+    if args.out is not None:
+        with open(args.out, "w") as f_summary_out:
+            f_summary_out.write(s_summary)
+        print(f"{args.out} file written")
+    if args.plot is not None:
+        fig = make_figure(headless=True)
+        axis = fig.subplots()
+        axis.bar(d_c_index.keys(), d_c_index.values())
+        axis.set_title(f"Letter frequency for {args.file}")
+        show_or_save_figure(fig, args.plot)
+
+    d_result = {"file": args.file, "letter_counts": d_c_index}
+    if isinstance(word_counts, SpaceSaving):
+        d_result.update({"word_count": word_counts.n_total, "max_unmonitored_word_count": word_counts.n_max_unmonitored_count})
+    else:
+        d_result.update({"word_count": sum(word_counts.values()), "unique_words": len(word_counts)})
+    if args.top_words is not None:
+        d_result["top_words"] = [{"word": word, "count": n, "error": n_error} for word, n, n_error in top_k_words(word_counts, args.top_words)]
+
+    if not args.json:
+        print(s_summary)
+        for d in d_result.get("top_words", []):
+            print(f"\t{d['word']}:\t{d['count']}" + (f"\t(+/-{d['error']})" if d["error"] else ""))
+    return d_result
+
+def cli_toggle_case(args):
+    t0 = time.perf_counter()
+    words_file_to_toggle_case(args.file_in, args.file_out, use_mmap=args.mmap)
+    return {"file_in": args.file_in, "file_out": args.file_out, "bytes": os.path.getsize(args.file_out), "seconds": time.perf_counter() - t0}
+
+def cli_lookup(args):
+    if os.path.isdir(args.file):
+        with CorpusStore(args.file) as corpus_store:
+            l_indices = bisect_many(corpus_store, args.words)
+    elif args.word_index:
+        with WordIndex(args.file) as word_index:
+            l_indices = bisect_many(word_index, args.words, strategy=args.strategy)
+    else:
+        l_indices = bisect_many(sorted(words_file_to_list(args.file)), args.words, strategy=args.strategy, assume_sorted=True)
+
+    if not args.json:
+        for word, i in zip(args.words, l_indices):
+            print(f"{word}:\t{i if i is not None else 'not found'}")
+    return {"file": args.file, "indices": dict(zip(args.words, l_indices))}
+
+def cli_build_store(args):
+    return {"file": args.file, "store": args.store, "n_tokens": build_corpus_store(args.file, args.store)}
+
+def cli_benchmark(args):
+    d_results, l_regressions = {}, []
+    if "stages" in args.reports:
+        d_results, l_regressions = run_benchmark_suite(args.file, l_sizes=args.sizes, fname_json_out=args.out, fname_baseline=args.baseline, f_tolerance=args.tolerance, n_warmup=args.warmup, n_samples=args.samples)
+    if "sim-scaling" in args.reports:
+        d_results["sim_scaling"] = benchmark_bd_paradox_sim_scaling(args.sims)
+    if "lookups" in args.reports:
+        l_words = words_file_to_list(args.file)
+        d_results["lookups"] = benchmark_bisect_many(l_words, l_words)
+    if "tokenizers" in args.reports:
+        d_results["tokenizers"] = benchmark_tokenizers(args.file, n_warmup=args.warmup, n_samples=args.samples)
+    return {**d_results, "regressions": l_regressions}
+
+def cli_serve(args):
+    run_summary_service(args.root, s_host=args.host, n_port=args.port, workers=args.workers, n_max_concurrency=args.concurrency)
+    return {}
+
+def make_arg_parser():
+    parser = argparse.ArgumentParser(description="CECS 174 final project: Birthday Paradox simulations and text file processing.", epilog="Without a subcommand, every stage is run in turn (the original demo).")
+    subparsers = parser.add_subparsers(dest="command", metavar="command")
+
+    # every subcommand takes --json (and prints its progress to stderr when given, so that stdout is nothing but the JSON result)
+    parser_common = argparse.ArgumentParser(add_help=False)
+    parser_common.add_argument("--json", action="store_true", help="print the result as JSON")
+
+    p = subparsers.add_parser("simulate", parents=[parser_common], help="run Birthday Paradox simulations")
+    p.add_argument("--sims", type=int, default=10**6, help="number of simulations (default: %(default)s)")
+    p.add_argument("--class-size", type=int, default=N_DEFAULT_CLASS_SIZE, help="number of students (default: %(default)s)")
+    p.add_argument("--leap-year", action="store_true")
+    p.add_argument("--python", action="store_true", help="use the pure Python engine instead of numpy")
+    p.add_argument("--workers", type=int, default=1, help="number of worker processes for the numpy engine (0 means one per core)")
+    p.add_argument("--seed", type=int, default=None)
+    p.add_argument("--adaptive", type=float, default=None, metavar="TOLERANCE", help="instead of --sims, simulate until the 95%% confidence interval is within +/-TOLERANCE")
+    p.add_argument("--plot", default=None, metavar="FNAME", help="render the convergence curve to FNAME (PNG, SVG...)")
+    p.add_argument("--recorder", choices=S_CONVERGENCE_MODES, default="log", help="how the plotted convergence curve is decimated (default: %(default)s)")
+    p.set_defaults(fn_command=cli_simulate)
+
+    p = subparsers.add_parser("summarize", parents=[parser_common], help="summarize a text file (word count and letter frequencies)")
+    p.add_argument("file", help="a text file, or a corpus store directory (see build-store)")
+    p.add_argument("--no-streaming", action="store_true", help="read the whole file into memory first (the original implementation)")
+    p.add_argument("--tokenizer", choices=sorted(D_TOKENIZER_ENGINES), default=None, help=f"tokenizer engine used when streaming (default: {S_DEFAULT_TOKENIZER})")
+    p.add_argument("--out", default=None, metavar="FNAME", help="also write the summary to FNAME")
+    p.add_argument("--plot", default=None, metavar="FNAME", help="render the letter frequency histogram to FNAME (PNG, SVG...)")
+    p.add_argument("--top-words", type=int, default=None, metavar="K", help="also report the K most frequent words")
+    p.add_argument("--word-memory", type=int, default=None, metavar="MB", help="count words approximately within MB megabytes (see SpaceSaving)")
+    p.set_defaults(fn_command=cli_summarize)
+
+    p = subparsers.add_parser("toggle-case", parents=[parser_common], help="write a copy of a text file with the case of every letter toggled")
+    p.add_argument("file_in")
+    p.add_argument("file_out")
+    p.add_argument("--mmap", action="store_true", help="memory-map the input")
+    p.set_defaults(fn_command=cli_toggle_case)
+
+    p = subparsers.add_parser("lookup", parents=[parser_common], help="find words in the sorted word list of a text file")
+    p.add_argument("file", help="a text file, or a corpus store directory (see build-store)")
+    p.add_argument("words", nargs="+")
+    p.add_argument("--word-index", action="store_true", help="file is a word index (see build_word_index()) rather than a text file")
+    p.add_argument("--strategy", choices=S_BISECT_MANY_STRATEGIES, default="auto")
+    p.set_defaults(fn_command=cli_lookup)
+
+    p = subparsers.add_parser("build-store", parents=[parser_common], help="tokenize a text file once into a memory-mapped corpus store")
+    p.add_argument("file")
+    p.add_argument("store", help="directory to write the store to")
+    p.set_defaults(fn_command=cli_build_store)
+
+    p = subparsers.add_parser("benchmark", parents=[parser_common], help="benchmark every pipeline stage over a sweep of input sizes (and the other engines, see --reports)")
+    p.add_argument("file", nargs="?", default="mobysmall.txt")
+    p.add_argument("--reports", choices=S_BENCHMARK_REPORTS, nargs="+", default=["stages"], help="stages: every pipeline stage over --sizes; sim-scaling: the numpy simulation engine across worker counts (with --sims); "
+                   "lookups: bisect_many() strategies against a bisect() loop (looking up every word of the file); tokenizers: the tokenizer engines against process_token_to_word() (default: %(default)s)")
+    p.add_argument("--sims", type=int, default=10**7, help="number of simulations for the sim-scaling report (default: %(default)s)")
+    p.add_argument("--sizes", type=int, nargs="+", default=L_BENCHMARK_INPUT_SIZES, metavar="N_BYTES")
+    p.add_argument("--warmup", type=int, default=N_BENCHMARK_WARMUP)
+    p.add_argument("--samples", type=int, default=N_BENCHMARK_SAMPLES)
+    p.add_argument("--out", default=None, metavar="FNAME", help="write the results to FNAME as JSON")
+    p.add_argument("--baseline", default=None, metavar="FNAME", help="compare against earlier results (exits with status 1 on regressions)")
+    p.add_argument("--tolerance", type=float, default=F_BENCHMARK_REGRESSION_TOLERANCE)
+    p.set_defaults(fn_command=cli_benchmark)
+
+    p = subparsers.add_parser("serve", help="run the summarization service (see SummaryService)")
+    p.add_argument("--root", default=".", help="directory the served files must live under (default: %(default)s)")
+    p.add_argument("--host", default=S_DEFAULT_SERVICE_HOST)
+    p.add_argument("--port", type=int, default=N_DEFAULT_SERVICE_PORT)
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--concurrency", type=int, default=N_DEFAULT_SERVICE_CONCURRENCY)
+    p.set_defaults(fn_command=cli_serve, json=False)
+
+    return parser
+
+def main(argv=None):
+    """
+    This function is the command-line entry point (see make_arg_parser()).
+
+    returns:
+        the exit status
+    """
+
+    parser = make_arg_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        run_demo()
+        return 0
+    if args.command == "summarize" and args.tokenizer is not None and (args.no_streaming or os.path.isdir(args.file)):
+        parser.error("--tokenizer only applies when streaming a text file (not with --no-streaming or a corpus store)")
+    if args.command == "simulate" and args.adaptive is not None and not args.adaptive > 0:
+        parser.error("--adaptive TOLERANCE must be > 0")
+    if getattr(args, "workers", None) == 0:
+        args.workers = None
+
+    with contextlib.redirect_stdout(sys.stderr) if args.json else contextlib.nullcontext():
+        d_result = args.fn_command(args)
+
+    if args.json:
+        print(json.dumps(d_result, indent=2))
+    return 1 if d_result.get("regressions") else 0
+# ******************** functions: END ********************
+
+
+
+
+# **************************************** main body (simply calls main() when this py file is exec'ed from bash): BEGIN ****************************************
+if __name__ == '__main__':
+    sys.exit(main())
+# **************************************** main body (simply calls main() when this py file is exec'ed from bash): END ****************************************